@@ -0,0 +1,86 @@
+#! /usr/bin/env python3
+'''How long does tablinum_filter take to start, when all it has to do is line up a table?
+
+This runs a plain reformat (no verbs) of a small table in a fresh
+interpreter a few times, with `python -X importtime`, and shows the
+median time for the whole run, the median time spent importing, and the
+modules that took longest to import, with their own time and the time
+including everything they imported in turn.
+
+    python benchmarks/bench_startup.py [--runs N] [--top N]
+
+The first run is not counted, so that Python has a chance to write its
+bytecode caches (unless PYTHONDONTWRITEBYTECODE is set, in which case
+every run has to compile tablinum again, and the times will be much worse).
+'''
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import tablinum
+
+SCRIPT = 'from tablinum.tablinum import filter; filter()'
+IMPORT_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)')
+
+
+def one_run(path):
+    '''Run the filter once on path, and return the wall time, and a dict of
+    (self, cumulative) import times in microseconds for each module, with
+    the nesting level of each one'''
+    start = time.perf_counter()
+    cp = subprocess.run([sys.executable, '-X', 'importtime', '-c', SCRIPT, '--file', path],
+                        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True)
+    elapsed = time.perf_counter() - start
+
+    modules = {}
+    for line in cp.stderr.splitlines():
+        if (m := IMPORT_LINE.match(line)) is not None:
+            modules[m.group(4)] = (int(m.group(1)), int(m.group(2)), len(m.group(3)))
+    return elapsed, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=11, help="How many runs to time")
+    parser.add_argument("--top", type=int, default=10, help="How many of the slowest imports to show")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'sample.txt')
+        with open(path, 'w') as f:
+            f.write('Name  Count  Price\n')
+            for i in range(20):
+                f.write(f'item{i}  {i * 7}  {i * 1.25:.2f}\n')
+
+        one_run(path)
+        runs = [one_run(path) for _ in range(args.runs)]
+
+    walls = [wall for wall, _ in runs]
+    totals = [sum(c for _, c, level in modules.values() if level == 1) for _, modules in runs]
+    print(f'Whole run: {statistics.median(walls) * 1000:.1f} ms, '
+          f'importing: {statistics.median(totals) / 1000:.1f} ms, including Python\'s own '
+          f'(median of {args.runs})')
+
+    # take the median of each module over the runs
+    names = set().union(*(modules for _, modules in runs))
+    slowest = tablinum.Table()
+    slowest.append(['Module', 'Self ms', 'Cumulative ms'])
+    rows = []
+    for name in names:
+        times = [modules[name] for _, modules in runs if name in modules]
+        own = statistics.median(s for s, _, _ in times)
+        rows.append((statistics.median(c for _, c, _ in times), own, name))
+    for cumulative, own, name in sorted(rows, reverse=True)[:args.top]:
+        slowest.append([name, f'{own / 1000:.1f}', f'{cumulative / 1000:.1f}'])
+    slowest.do('rule 1')
+    print(slowest)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#! /usr/bin/env python3
+'''Does Table(typed=True) pay for itself on an agenda of several verbs?
+
+A typed table parses each distinct value in a column once, as the verbs
+first look at it, and keeps the answer, so an agenda whose verbs look at
+the same cells again and again should be quicker, even though it parses
+every cell as the table is loaded, and has to forget the values of cells
+that go, now and then.  This times loading a table made by synthetic.py
+into a typed and an untyped Table, doing the same agenda on each, and
+printing it, with the best of --repeat runs of each, and the peak memory
+each one allocates (measured separately, since tracemalloc slows
+everything down).
+
+    python benchmarks/bench_typed.py [--rows 100000] [--mix nndist] [--repeat 3]
+                                     [--agenda "filter a>0 tap x+1 sort B add mean"]
+
+The agendas should not use verbs that print messages, like levels, since
+they stop the agenda there.
+'''
+
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+import tablinum
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))  # for synthetic, wherever this is run from
+import synthetic  # noqa: E402
+
+AGENDAS = (
+    'filter a>0 filter b<500 sort B add sum mean',
+    'tap x*2 filter a>100 dp 1 sort A add mean',
+    'sort a sort b sort A add median add mean add max',
+)
+
+
+def _run(rows, typed, agenda):
+    gc.collect()
+    start = time.perf_counter()
+    table = tablinum.Table(typed=typed)
+    table.parse_lol(rows)
+    table.do(agenda)
+    str(table)
+    return time.perf_counter() - start
+
+
+def _peak(rows, typed, agenda):
+    gc.collect()
+    tracemalloc.start()
+    table = tablinum.Table(typed=typed)
+    table.parse_lol(rows)
+    table.do(agenda)
+    str(table)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000, help="How many rows in the table")
+    parser.add_argument("--mix", default='nndist', help="The kinds of column, as for synthetic.py")
+    parser.add_argument("--repeat", type=int, default=3, help="How many times to time each one")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--agenda", action='append', help="An agenda to time (default some mixtures)")
+    args = parser.parse_args()
+
+    rows = synthetic.make_rows(args.rows, args.mix, args.seed)
+    results = tablinum.Table()
+    results.append(['Agenda', 'Untyped s', 'Typed s', 'Ratio', 'Untyped MiB', 'Typed MiB'])
+    for agenda in args.agenda or AGENDAS:
+        times = [min(_run(rows, typed, agenda) for _ in range(args.repeat)) for typed in (False, True)]
+        peaks = [_peak(rows, typed, agenda) / 2 ** 20 for typed in (False, True)]
+        results.append([agenda, f'{times[0]:.3f}', f'{times[1]:.3f}', f'{times[1] / times[0]:.2f}',
+                        f'{peaks[0]:.1f}', f'{peaks[1]:.1f}'])
+    results.do('rule 1')
+    print(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+#! /usr/bin/env python3
+'''Time each verb, and the parsers and tabulate, on synthetic tables of several sizes
+
+For each size (counted in cells), this makes a table with synthetic.py,
+loads it into a fresh typed Table (as the filter does) for each timing,
+and times `do` with each verb in Table.operations, with an argument that
+makes sense for the default mix of columns, then parse_lines, parse_lol,
+and parse_tex on the same table as text, and tabulate.  Each one is
+timed --repeat times, and the best and the median are kept.
+
+    python benchmarks/bench_verbs.py [--sizes 1e3,1e4,1e5] [--mix nndist]
+                                     [--verbs sort,filter] [--repeat 3]
+                                     [--output now.json] [--compare before.json]
+
+The results go to --output as JSON, with the versions of Python and
+tablinum, so you can keep them, and --compare prints the ratio of each
+time to the same one in an earlier file, marking those that are more than
+25% slower.  The biggest sizes take a long time, and a lot of memory:
+10M cells need several gigabytes.
+'''
+
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+import tablinum
+import tablinum.__about__
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))  # for synthetic, wherever this is run from
+import synthetic  # noqa: E402
+
+# What to give each verb, for the default mix: a, b numbers, c dates, d IPs, e sizes, f text.
+# Verbs not listed here get no argument.
+ARGUMENTS = {
+    'add': 'sum mean',
+    'arr': 'abc(a+b)def',
+    'dp': '2',
+    'filter': 'a>5000',
+    'gen': '1000',
+    'group': 'c',
+    'groupby': 'f sum(a) mean(b)',
+    'label': 'one two three',
+    'levels': 'a',
+    'make': 'csv',
+    'pivot': 'long',
+    'roll': 'b',
+    'sf': '3',
+    'shuffle': 'a',
+    'sort': 'c',
+    'tap': 'x*2',
+    'uniq': 'f',
+}
+PARSERS = ('parse_lines', 'parse_lol', 'parse_tex')
+SLOWER = 1.25
+
+
+def _sizes(text):
+    return [int(float(x)) for x in text.split(',')]
+
+
+def _load(rows):
+    table = tablinum.Table(typed=True)
+    table.parse_lol(rows)
+    return table
+
+
+def _time(setup, run, repeat):
+    '''Call setup, then time run with what it returns, repeat times, and return
+    the times and the last result
+
+    As with timeit, the garbage collector is kept out of the way while the
+    clock is running, so that a collection of what setup made is not timed.
+    '''
+    times = []
+    result = None
+    for _ in range(repeat):
+        thing = setup()
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            run(thing)
+            times.append(time.perf_counter() - start)
+        finally:
+            gc.enable()
+        result = thing
+    return times, result
+
+
+def benchmark(cells, mix, verbs, repeat, seed):
+    "Generate a list of result dicts for one size of table"
+    cols = len(mix)
+    rows = synthetic.make_rows(max(cells // cols, 1), mix, seed)
+    sources = {
+        'parse_lines': ['  '.join(r) for r in rows],
+        'parse_lol': rows,
+        'parse_tex': [' & '.join(r) + ' \\cr' for r in rows],
+    }
+
+    def entry(name, argument, times, rows_out):
+        return {'name': name, 'argument': argument, 'cells': len(rows) * cols, 'rows': len(rows),
+                'cols': cols, 'best': min(times), 'median': statistics.median(times), 'rows_out': rows_out,
+                'runs': len(times)}
+
+    for name in verbs:
+        if name in PARSERS:
+            times, table = _time(lambda: tablinum.Table(typed=True),
+                                 lambda t, name=name: getattr(t, name)(sources[name]), repeat)
+            yield entry(name, '', times, len(table))
+        elif name == 'tabulate':
+            times, table = _time(lambda: _load(rows), lambda t: list(t.tabulate()), repeat)
+            yield entry(name, '', times, len(table))
+        else:
+            argument = ARGUMENTS.get(name, '')
+            times, table = _time(lambda: _load(rows), lambda t: t.do(f'{name} {argument}'), repeat)
+            yield entry(name, argument, times, len(table))
+
+
+def _key(result):
+    return (result['name'], result['argument'], result['cells'])
+
+
+def compare(results, earlier):
+    "A Table of the ratio of each time to the one for the same verb and size in the earlier results"
+    before = {_key(r): r for r in earlier['results']}
+    table = tablinum.Table()
+    table.append(['Verb', 'Cells', 'Before', 'Now', 'Ratio', ''])
+    for r in results:
+        old = before.get(_key(r))
+        if old is None or not old['best']:
+            continue
+        ratio = r['best'] / old['best']
+        table.append([r['name'], r['cells'], f"{old['best']:.4f}", f"{r['best']:.4f}", f'{ratio:.2f}',
+                      'slower' if ratio > SLOWER else ''])
+    table.do('rule 1')
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=_sizes, default=_sizes('1e3,1e4,1e5'),
+                        help="Comma-separated numbers of cells (default 1e3,1e4,1e5)")
+    parser.add_argument("--mix", default='nndist', help="The kinds of column, as for synthetic.py")
+    parser.add_argument("--verbs",
+                        help="Comma-separated verbs (or parsers, or tabulate) to time (default all)")
+    parser.add_argument("--repeat", type=int, default=3, help="How many times to time each one")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Compare the results with this earlier JSON file")
+    args = parser.parse_args()
+
+    everything = sorted(tablinum.Table().operations) + list(PARSERS) + ['tabulate']
+    verbs = everything if args.verbs is None else args.verbs.split(',')
+    unknown = [v for v in verbs if v not in everything]
+    if unknown:
+        parser.error(f'not a verb: {" ".join(unknown)}')
+
+    results = []
+    summary = tablinum.Table()
+    summary.append(['Verb', 'Argument', 'Cells', 'Best', 'Median', 'Rows out'])
+    for cells in args.sizes:
+        for r in benchmark(cells, args.mix, verbs, args.repeat, args.seed):
+            results.append(r)
+            summary.append([r['name'], r['argument'] or '-', r['cells'],
+                            f"{r['best']:.4f}", f"{r['median']:.4f}", r['rows_out']])
+            print(f"{r['name']:>12} {r['cells']:>10} {r['best']:.4f}", file=sys.stderr)
+    summary.do('rule 1')
+    print(summary)
+
+    report = {
+        'when': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'tablinum': tablinum.__about__.__version__,
+        'mix': args.mix,
+        'seed': args.seed,
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=1)
+
+    if args.compare:
+        with open(args.compare) as f:
+            print()
+            print(compare(results, json.load(f)))
+
+
+if __name__ == "__main__":
+    main()
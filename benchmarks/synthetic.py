@@ -0,0 +1,95 @@
+#! /usr/bin/env python3
+'''Make up tables of any size, with a chosen mix of the kinds of values tablinum has to deal with
+
+The mix is a string with one letter for each column:
+
+    n  numbers, a mixture of integers and decimals, some negative
+    d  ISO dates
+    i  IPv4 addresses
+    s  sizes with SI suffixes, like 50k, 4 MiB, or 1.12 GB
+    t  free text, one to three words
+
+So the default, "nndist", makes six columns: two of numbers, and one of each
+of the others.  The values come from a seeded random generator, so the same
+arguments always give the same table.
+
+    python benchmarks/synthetic.py [--mix nndist] [--seed 42] ROWS > table.txt
+
+prints a table you can try with tablinum_filter.
+'''
+
+import argparse
+import datetime
+import random
+
+KINDS = {
+    'n': 'numbers',
+    'd': 'dates',
+    'i': 'IP addresses',
+    's': 'SI sizes',
+    't': 'text',
+}
+
+WORDS = '''alpha bravo charlie delta echo foxtrot golf hotel india juliet kilo lima mike
+november oscar papa quebec romeo sierra tango uniform victor whiskey xray yankee zulu'''.split()
+SUFFIXES = ('k', 'K', 'M', 'G', 'KB', 'MB', 'GB', 'KiB', 'MiB', 'GiB')
+FIRST_DAY = datetime.date(1990, 1, 1).toordinal()
+
+
+def _number(rng):
+    if rng.random() < 0.5:
+        return str(rng.randint(0, 9999))
+    return f'{rng.uniform(-1000, 1000):.2f}'
+
+
+def _date(rng):
+    return datetime.date.fromordinal(FIRST_DAY + rng.randrange(15000)).isoformat()
+
+
+def _ip(rng):
+    return '.'.join(str(rng.randrange(256)) for _ in range(4))
+
+
+def _size(rng):
+    space = ' ' if rng.random() < 0.5 else ''
+    return f'{rng.uniform(1, 999):.{rng.randrange(3)}f}{space}{rng.choice(SUFFIXES)}'
+
+
+def _text(rng):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 3)))
+
+
+MAKERS = {'n': _number, 'd': _date, 'i': _ip, 's': _size, 't': _text}
+
+
+def make_rows(rows, mix='nndist', seed=42):
+    '''A list of rows, each a list of strings, one column for each letter in mix
+
+    >>> for row in make_rows(2, 'ndist', seed=1):
+    ...     print(row)
+    ['1033', '2001-06-11', '60.253.230.241', '788KiB', 'mike']
+    ['34', '2021-03-19', '228.136.117.52', '32MiB', 'mike']
+    '''
+    unknown = set(mix) - set(MAKERS)
+    if unknown or not mix:
+        raise ValueError(f'The mix should be letters from {"".join(MAKERS)}, not {mix!r}')
+    rng = random.Random(seed)
+    makers = [MAKERS[k] for k in mix]
+    return [[make(rng) for make in makers] for _ in range(rows)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("rows", type=int, help="How many rows to make")
+    parser.add_argument("--mix", default='nndist',
+                        help="One letter for each column: "
+                             + ', '.join(f'{k}={v}' for k, v in KINDS.items()))
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    for row in make_rows(args.rows, args.mix, args.seed):
+        print('  '.join(row))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,15 @@
 # SPDX-FileCopyrightText: 2024-present Toby Thurston <toby.thurston@gmail.com>
 #
 # SPDX-License-Identifier: MIT
-from tablinum.tablinum import Table as Table
+
+# Table is only imported when it is first used, so that the daemon client
+# (tablinum.tab_daemon) can start without loading all of tablinum
+__all__ = ['Table']
+
+
+def __getattr__(name):
+    if name == 'Table':
+        from tablinum.tablinum import Table
+        globals()['Table'] = Table
+        return Table
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
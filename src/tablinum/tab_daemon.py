@@ -0,0 +1,295 @@
+#! /usr/bin/env python3
+'''A long-lived tablinum_filter, for editors that run the filter on every change
+
+`tablinum_daemon` imports tablinum once and then serves requests on a Unix
+socket; `tablinum_client` takes the same arguments as `tablinum_filter`,
+and sends them, with its working directory, its settings from the
+environment, and its standard input, to the daemon, which runs the filter
+and sends back what it prints.  So each request only pays for starting
+the client, which imports nothing but this module, and the caches of
+parsed numbers, dates, and compiled expressions stay warm from one
+request to the next.  If there is no daemon, the client just runs the
+filter itself.
+
+Standard input goes to the daemon as it is read, after the request, and
+up to the end of the stream, so that --stream works as it does without the
+daemon.  Everything the daemon sends back is in frames: one byte for the
+channel (1 for standard output, 2 for standard error, or x for the exit
+status), four for the length, and then that many bytes.
+'''
+
+import json
+import os
+import socket
+import struct
+import sys
+
+_FRAME = struct.Struct('>cI')
+_FLUSH_SIZE = 65536
+
+
+def socket_path():
+    '''Where the daemon listens: $TABLINUM_SOCKET, or a socket for this user
+
+    >>> os.environ['TABLINUM_SOCKET'] = '/tmp/example.sock'
+    >>> socket_path()
+    '/tmp/example.sock'
+    >>> del os.environ['TABLINUM_SOCKET']
+    '''
+    path = os.environ.get('TABLINUM_SOCKET')
+    if path:
+        return path
+    folder = os.environ.get('XDG_RUNTIME_DIR') or '/tmp'
+    return os.path.join(folder, f'tablinum-{os.getuid()}.sock')
+
+
+def _is_setting(name):
+    "Should the daemon use the client's value of this environment variable?"
+    return name.startswith('TABLINUM_') or name == 'TZ'
+
+
+def settings():
+    '''The settings in this environment that the filter cares about
+
+    >>> os.environ['TABLINUM_WORKERS'] = '4'
+    >>> settings()['TABLINUM_WORKERS']
+    '4'
+    >>> del os.environ['TABLINUM_WORKERS']
+    '''
+    return {name: value for name, value in os.environ.items() if _is_setting(name)}
+
+
+def _use_settings(new):
+    "Replace the settings in the environment with new ones, and return the old ones"
+    import time
+    old = settings()
+    for name in old:
+        del os.environ[name]
+    os.environ.update(new)
+    time.tzset()
+    return old
+
+
+def _send_frame(sock, channel, payload):
+    sock.sendall(_FRAME.pack(channel, len(payload)) + payload)
+
+
+def _read_exactly(stream, n):
+    data = stream.read(n)
+    if len(data) < n:
+        raise EOFError('the daemon hung up')
+    return data
+
+
+class _Channel:
+    '''A text file that sends what is written to it back to the client, in frames
+
+    Writes are collected until there are enough to be worth sending, so a
+    big table goes back in a few large frames, as it is printed.
+    '''
+
+    def __init__(self, sock, channel):
+        self.sock = sock
+        self.channel = channel
+        self.pending = []
+        self.size = 0
+
+    def write(self, text):
+        self.pending.append(text)
+        self.size += len(text)
+        if self.size >= _FLUSH_SIZE:
+            self.flush()
+        return len(text)
+
+    def flush(self):
+        if self.pending:
+            _send_frame(self.sock, self.channel, ''.join(self.pending).encode('utf-8', 'surrogateescape'))
+            self.pending.clear()
+            self.size = 0
+
+    def isatty(self):
+        return False
+
+
+def _handle(connection):
+    '''Read one request from the connection, run the filter on it, and send back the results
+
+    A request is a line of JSON with the arguments, the working directory,
+    the settings from the environment, and whether standard input is a
+    terminal, followed by standard input itself, up to the end of the
+    stream.  The filter reads that from the connection as it needs it, and
+    the settings are used for this request only.
+    '''
+    import contextlib
+    import io
+    import traceback
+    from tablinum.tablinum import run_filter
+
+    rfile = connection.makefile('rb')
+    header = json.loads(rfile.readline())
+    if header.get('stdin'):
+        stdin = io.TextIOWrapper(rfile, encoding='utf-8', errors='surrogateescape')
+    else:
+        stdin = io.StringIO('')
+
+    out = _Channel(connection, b'1')
+    err = _Channel(connection, b'2')
+    status = 0
+    daemon_settings = _use_settings(header.get('settings', {}))
+    try:
+        os.chdir(header.get('cwd', '/'))
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+            run_filter(header.get('argv', []), stdin, out, prog='tablinum_filter')
+    except SystemExit as e:  # from argparse
+        status = 0 if e.code is None else (e.code if isinstance(e.code, int) else 1)
+        if isinstance(e.code, str):
+            err.write(e.code + '\n')
+    except Exception:
+        err.write(traceback.format_exc())
+        status = 1
+    finally:
+        _use_settings(daemon_settings)
+    out.flush()
+    err.flush()
+    _send_frame(connection, b'x', str(status).encode())
+
+
+def serve(argv=None):
+    '''Run the daemon: tablinum_daemon [--socket PATH] [--idle SECONDS]'''
+    import argparse
+    import socketserver
+
+    parser = argparse.ArgumentParser(prog='tablinum_daemon')
+    parser.add_argument("--socket", default=socket_path(), metavar="PATH",
+                        help="Listen on this socket (default $TABLINUM_SOCKET, "
+                             "or one in $XDG_RUNTIME_DIR or /tmp)")
+    parser.add_argument("--idle", type=float, default=0, metavar="SECONDS",
+                        help="Stop after this long without a request (default: never)")
+    args = parser.parse_args(argv)
+
+    if not hasattr(socket, 'AF_UNIX'):
+        parser.exit(1, 'tablinum_daemon: this system has no Unix sockets\n')
+
+    # a socket left by a daemon that has stopped is removed, but not one still in use
+    if os.path.exists(args.socket):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(args.socket)
+        except OSError:
+            os.unlink(args.socket)
+        else:
+            parser.exit(1, f'tablinum_daemon: already running on {args.socket}\n')
+        finally:
+            probe.close()
+
+    class Handler(socketserver.BaseRequestHandler):
+        def handle(self):
+            _handle(self.request)
+
+    class Server(socketserver.UnixStreamServer):
+        idle = False
+
+        def handle_timeout(self):
+            self.idle = True
+
+    import tablinum.tablinum  # noqa: F401 -- load it now, not on the first request
+
+    mask = os.umask(0o077)  # only this user may connect
+    try:
+        server = Server(args.socket, Handler)
+    finally:
+        os.umask(mask)
+    server.timeout = args.idle or None
+    try:
+        with server:
+            while not server.idle:
+                server.handle_request()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        os.unlink(args.socket)
+
+
+def request(argv, stdin=None, path=None):
+    '''Send a request to the daemon, and return a generator of the (channel, bytes) frames that come back
+
+    stdin is the file descriptor of standard input, or None if that is a
+    terminal; what it holds is sent as it is read, while the frames come back, so the filter can start
+    before it has all arrived, and neither end waits for the other.  Raises
+    OSError at once if there is no daemon listening at path, or if the
+    socket there belongs to someone else, and before reading any of stdin.
+    '''
+    if path is None:
+        path = socket_path()
+    if os.stat(path).st_uid != os.getuid():
+        raise PermissionError(f'{path} belongs to another user')
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        raise
+    header = {'argv': list(argv), 'cwd': os.getcwd(), 'settings': settings(), 'stdin': stdin is not None}
+    return _replies(sock, json.dumps(header).encode() + b'\n', stdin)
+
+
+def _send_input(sock, stdin):
+    '''Send the rest of stdin to the daemon, then tell it that is all
+
+    This reads the file descriptor, not sys.stdin, which would hold a lock
+    while it waits, and stop the client exiting when the daemon has finished.
+    '''
+    try:
+        while chunk := os.read(stdin, _FLUSH_SIZE):
+            sock.sendall(chunk)
+        sock.shutdown(socket.SHUT_WR)
+    except OSError:
+        pass  # the daemon has stopped reading, and its replies say why
+
+
+def _replies(sock, header, stdin):
+    with sock:
+        sock.sendall(header)
+        if stdin is None:
+            sock.shutdown(socket.SHUT_WR)
+        else:
+            import threading
+            threading.Thread(target=_send_input, args=(sock, stdin), daemon=True).start()
+        replies = sock.makefile('rb')
+        while True:
+            channel, n = _FRAME.unpack(_read_exactly(replies, _FRAME.size))
+            payload = _read_exactly(replies, n)
+            yield channel, payload
+            if channel == b'x':
+                return
+
+
+def client():
+    '''Run tablinum_filter in the daemon if there is one, or here if not
+
+    The arguments are the same as for tablinum_filter, and the output and
+    exit status should be too.
+    '''
+    argv = sys.argv[1:]
+    stdin = None if sys.stdin is None or sys.stdin.isatty() else sys.stdin.fileno()
+    try:
+        replies = request(argv, stdin)
+    except (OSError, AttributeError):  # AttributeError: no AF_UNIX on this system
+        from tablinum.tablinum import run_filter
+        run_filter(argv)
+        return
+
+    outputs = {b'1': sys.stdout.buffer, b'2': sys.stderr.buffer}
+    try:
+        for channel, payload in replies:
+            if channel == b'x':
+                sys.exit(int(payload))
+            outputs[channel].write(payload)
+            outputs[channel].flush()
+    except (OSError, EOFError):
+        sys.exit('tablinum_client: the daemon stopped before it finished')
+
+
+if __name__ == "__main__":
+    client()
@@ -9,6 +9,67 @@ Toby Thurston -- 21 Apr 2024
 
 '''
 import datetime
+import re
+
+# The formats that parse_date tries, in this order
+DATE_FORMATS = (
+    '%Y-%m-%d', '%Y%m%d', '%d %B %Y', '%d %b %Y', '%G-W%V-%u', '%d-%b-%Y',
+    '%d %b %y', '%d %B %y', '%d/%m/%Y', '%d/%m/%y', '%B %d, %Y',
+    '%A %d %B %Y',
+    '%dth %b %Y', '%dst %b %Y', '%dnd %b %Y', '%drd %b %Y',
+    '%dth %B %Y', '%dst %B %Y', '%dnd %B %Y', '%drd %B %Y',
+    '%a %dth %b %Y', '%a %dst %b %Y', '%a %dnd %b %Y', '%a %drd %b %Y',
+    '%a %dth %B %Y', '%a %dst %B %Y', '%a %dnd %B %Y', '%a %drd %B %Y',
+    '%m/%d/%Y',
+    '%c', '%x',
+)
+
+# These can read the same string as an earlier format but swap the day and
+# the month, so they must only ever be tried in their proper turn.
+_AMBIGUOUS_FORMATS = ('%m/%d/%Y', '%c', '%x')
+
+_HAS_DIGIT = re.compile(r'\d')
+_DIGIT_RUNS = re.compile(r'\d+')
+_LETTER_RUNS = re.compile(r'[^\W\d_]+')
+_BLANKS = re.compile(r'\s+')
+
+MAX_ORDINAL = datetime.date.max.toordinal()
+MIN_ORDINAL = datetime.date.min.toordinal()
+DAYS = "Monday Tuesday Wednesday Thursday Friday Saturday Sunday".split()
+
+
+def _shape(sss):
+    '''Reduce a string to its shape: blanks removed, runs of digits as 9, runs of letters as a.
+    A format can only ever match strings with the same shape as the dates it makes.
+
+    >>> _shape('Sat 29th July 2023')
+    'a9a9'
+    >>> _shape('2022-W47-2')
+    '9-a9-9'
+    >>> _shape('192.168.0.1')
+    '9.9.9.9'
+    '''
+    return _LETTER_RUNS.sub('a', _DIGIT_RUNS.sub('9', _BLANKS.sub('', sss)))
+
+
+# Group the formats by shape, keeping them in order within each group, so
+# that parse_date only tries the formats that could possibly match...
+_FORMATS_BY_SHAPE = {}
+for _fmt in DATE_FORMATS:
+    _FORMATS_BY_SHAPE.setdefault(_shape(datetime.date(2001, 1, 1).strftime(_fmt)), []).append(_fmt)
+_FORMATS_BY_SHAPE = {k: tuple(v) for k, v in _FORMATS_BY_SHAPE.items()}
+
+# ...and remember which one worked last time for each shape, by keeping a
+# copy of each group with that format moved to the front.  A column of dates
+# nearly always has a single shape and format, so after the first one each
+# date in the column is read by the first format we try.
+_format_order = dict(_FORMATS_BY_SHAPE)
+
+
+def _remember_format(shape, fmt):
+    "Put fmt at the front of the list for this shape, unless it has to wait its turn"
+    if fmt not in _AMBIGUOUS_FORMATS and _format_order[shape][0] != fmt:
+        _format_order[shape] = (fmt,) + tuple(f for f in _FORMATS_BY_SHAPE[shape] if f != fmt)
 
 
 def parse_date(sss, today=None):
@@ -52,23 +113,25 @@ def parse_date(sss, today=None):
     >>> parse_date("Sunday", today='2022-03-17')
     datetime.date(2022, 3, 20)
 
-    '''
+    >>> parse_date("12/25/2020")
+    datetime.date(2020, 12, 25)
 
-    maxo = datetime.date.max.toordinal()
-    mino = datetime.date.min.toordinal()
+    >>> parse_date("11/12/2020")  # still day first, even straight after a US date
+    datetime.date(2020, 12, 11)
+
+    '''
 
     if isinstance(sss, int):
-        if mino <= sss <= maxo:
+        if MIN_ORDINAL <= sss <= MAX_ORDINAL:
             return datetime.date.fromordinal(sss)
 
     sss = str(sss)
 
-    if sss.isdigit() and int(sss) <= maxo:
+    if sss.isdigit() and int(sss) <= MAX_ORDINAL:
         return datetime.date.fromordinal(int(sss))
 
-    days = "Monday Tuesday Wednesday Thursday Friday Saturday Sunday".split()
-    if sss.capitalize() in days:
-        iso_dow = 1 + days.index(sss.capitalize())
+    if sss.capitalize() in DAYS:
+        iso_dow = 1 + DAYS.index(sss.capitalize())
         if today is None:
             today = datetime.datetime.today()
         else:
@@ -76,20 +139,19 @@ def parse_date(sss, today=None):
         year, week = today.strftime("%G-%V").split("-")
         return datetime.datetime.strptime(f'{year}-W{week}-{iso_dow}', "%G-W%V-%u").date()
 
+    # all the formats need at least one digit, so don't bother trying them if there are none
+    if _HAS_DIGIT.search(sss) is None:
+        raise ValueError
+
     sss = sss.replace('Sept ', 'Sep ')
-    for fmt in ('%Y-%m-%d', '%Y%m%d', '%d %B %Y', '%d %b %Y', '%G-W%V-%u', '%d-%b-%Y',
-                '%d %b %y', '%d %B %y', '%d/%m/%Y', '%d/%m/%y', '%B %d, %Y',
-                '%A %d %B %Y',
-                '%dth %b %Y', '%dst %b %Y', '%dnd %b %Y', '%drd %b %Y',
-                '%dth %B %Y', '%dst %B %Y', '%dnd %B %Y', '%drd %B %Y',
-                '%a %dth %b %Y', '%a %dst %b %Y', '%a %dnd %b %Y', '%a %drd %b %Y',
-                '%a %dth %B %Y', '%a %dst %B %Y', '%a %dnd %B %Y', '%a %drd %B %Y',
-                '%m/%d/%Y',
-                '%c', '%x'):
+    shape = _shape(sss)
+    for fmt in _format_order.get(shape, ()):
         try:
-            return datetime.datetime.strptime(str(sss), fmt).date()
+            d = datetime.datetime.strptime(sss, fmt).date()
         except ValueError:
             continue
+        _remember_format(shape, fmt)
+        return d
 
     raise ValueError
 
@@ -0,0 +1,239 @@
+#! /usr/bin/env python3
+'''Small summaries of long columns, for when keeping every value would cost too much'''
+
+import collections
+import hashlib
+import heapq
+import itertools
+import math
+import random
+
+
+class QuantileSketch:
+    '''A KLL sketch, for the quantiles of a long column in bounded memory
+
+    The values go into a buffer, and when that fills up it is sorted and every
+    other value, starting at random from the first or the second, moves up to
+    the next level, where it stands for two values instead of one.  Each level
+    is compacted in the same way when it holds k values.  This is KLL with
+    levels of equal size (c = 1 in the paper); it keeps k log(n/k) values
+    rather than about 3k, but each level is at least as big as in the usual
+    KLL, so it is at least as accurate, and a long column costs a few thousand
+    values rather than all of them.  The coin has a fixed seed, so the same
+    column always gives the same answers.
+
+    `rank_error` is the error in the rank of an answer, as a fraction of the
+    count, that is exceeded less than 1% of the time.  This is the empirical
+    bound that DataSketches gives for the usual KLL with the same k, or the
+    worst case (the weight of all the compactions so far) if that is smaller,
+    and it is zero while the sketch still holds every value.
+
+    >>> s = QuantileSketch(k=50)
+    >>> s.extend(range(1, 100001))
+    >>> s.n, s.low, s.high
+    (100000, 1, 100000)
+    >>> abs(s.quantile(0.5) - 50000) <= s.rank_error * s.n
+    True
+    >>> round(s.rank_error, 3)
+    0.042
+    >>> t = QuantileSketch()
+    >>> t.extend([5, 3, 1, 4, 2])
+    >>> t.quantile(0.5), t.rank_error, sorted(t)
+    (3, 0.0, [1, 2, 3, 4, 5])
+    '''
+
+    def __init__(self, k=200):
+        self.k = max(k, 8)
+        self.levels = [[]]
+        self.n = 0
+        self.compacted = 0  # the sum of the weights of the compactions so far
+        self.coin = random.Random(k)
+        self._low = self._high = None
+
+    def capacity(self, h):
+        'How many values level h may hold before it is compacted'
+        return 4 * self.k if h == 0 else self.k
+
+    def extend(self, values):
+        'Add all the values from an iterable'
+        values = iter(values)
+        buffer = self.levels[0]
+        room = self.capacity(0)
+        while True:
+            before = len(buffer)
+            buffer.extend(itertools.islice(values, room - before))
+            self.n += len(buffer) - before
+            if len(buffer) < room:
+                return
+            self._compress()
+
+    def update(self, value):
+        'Add one value'
+        self.extend((value,))
+
+    def _compress(self):
+        'Compact each level that is full, from the bottom up'
+        h = 0
+        while h < len(self.levels):
+            level = self.levels[h]
+            if len(level) >= self.capacity(h):
+                if h + 1 == len(self.levels):
+                    self.levels.append([])
+                level.sort()
+                if h == 0:
+                    self._low = level[0] if self._low is None else min(self._low, level[0])
+                    self._high = level[-1] if self._high is None else max(self._high, level[-1])
+                spare = level.pop() if len(level) % 2 else None
+                self.levels[h + 1].extend(level[self.coin.getrandbits(1)::2])
+                self.compacted += 1 << h
+                level.clear()
+                if spare is not None:
+                    level.append(spare)
+            h += 1
+
+    @property
+    def low(self):
+        'The smallest value so far'
+        kept = self.levels[0] if self._low is None else self.levels[0] + [self._low]
+        return min(kept, default=None)
+
+    @property
+    def high(self):
+        'The largest value so far'
+        kept = self.levels[0] if self._high is None else self.levels[0] + [self._high]
+        return max(kept, default=None)
+
+    @property
+    def rank_error(self):
+        'The error in the rank of any quantile, as a fraction of n, at 99% confidence'
+        if not self.n:
+            return 0.0
+        return min(self.compacted / self.n, 1.854 / self.k ** 0.9657)
+
+    def __iter__(self):
+        'The values kept, where each one in level h stands for 2**h of the originals'
+        return itertools.chain.from_iterable(self.levels)
+
+    def __len__(self):
+        return sum(map(len, self.levels))
+
+    def quantile(self, p):
+        '''The value with rank nearest p * n, or None if p is not in [0, 1]
+
+        >>> s = QuantileSketch()
+        >>> s.extend([10, 20, 30, 40])
+        >>> [s.quantile(p) for p in (0, 0.25, 0.5, 1, 2)]
+        [10, 10, 20, 40, None]
+        '''
+        return self.quantiles((p,))[0]
+
+    def quantiles(self, pvalues):
+        'A list of quantiles, as for quantile, sorting the sketch only once'
+        weighted = sorted((x, 1 << h) for h, level in enumerate(self.levels) for x in level)
+        answers = []
+        for p in pvalues:
+            if not 0 <= p <= 1 or not self.n:
+                answers.append(None)
+            elif p == 0:
+                answers.append(self.low)
+            elif p == 1:
+                answers.append(self.high)
+            else:
+                target = p * self.n
+                seen = 0
+                for x, w in weighted:
+                    seen += w
+                    if seen >= target:
+                        break
+                answers.append(x)
+        return answers
+
+
+class HyperLogLog:
+    '''Count the distinct values in a long column in a few kilobytes
+
+    Each value is hashed, the first p bits of the hash pick one of 2**p
+    registers, and the register keeps the longest run of leading zeros seen
+    in the rest.  The hash is blake2b of the value as a string, rather than
+    the built-in hash, so the count is the same every time.  `error` is the
+    usual relative standard error, 1.04 / sqrt(2**p).
+
+    >>> h = HyperLogLog()
+    >>> h.extend(str(i) for i in range(100000))
+    >>> abs(len(h) - 100000) < 3 * h.error * 100000
+    True
+    >>> h.extend(str(i) for i in range(1000))
+    >>> abs(len(h) - 100000) < 3 * h.error * 100000
+    True
+    >>> small = HyperLogLog()
+    >>> small.extend('abcabc')
+    >>> len(small), round(small.error, 4)
+    (3, 0.0081)
+    '''
+
+    def __init__(self, p=14):
+        self.p = p
+        self.registers = bytearray(1 << p)
+
+    def extend(self, values):
+        'Add all the values from an iterable'
+        registers = self.registers
+        q = 64 - self.p
+        mask = (1 << q) - 1
+        blake2b = hashlib.blake2b
+        from_bytes = int.from_bytes
+        for x in values:
+            h = from_bytes(blake2b(str(x).encode(), digest_size=8).digest(), 'big')
+            j = h >> q
+            rank = q + 1 - (h & mask).bit_length()
+            if rank > registers[j]:
+                registers[j] = rank
+
+    @property
+    def error(self):
+        'The relative standard error of the count'
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def __len__(self):
+        'The estimated number of distinct values'
+        m = len(self.registers)
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return round(estimate)
+
+
+class FrequentItems:
+    '''The most common values in a long column, keeping at most 2k counts
+
+    This is the Misra-Gries summary.  Counts are merged in a chunk at a time,
+    and whenever more than 2k values are being counted, the (k+1)th biggest
+    count is taken off all of them, and those that drop to nothing are
+    forgotten.  So a count is never more than the true count, and never less
+    by more than `slack`, the total taken off so far, which is at most
+    n / (k + 1).  Any value that makes up more than 1 / (k + 1) of the column
+    is sure to be kept.
+
+    >>> f = FrequentItems(k=3)
+    >>> f.update(collections.Counter('aaaaaaaabbbbbbcccdefghij'))
+    >>> f.most_common(2), f.slack
+    ([('a', 7), ('b', 5)], 1)
+    '''
+
+    def __init__(self, k=1000):
+        self.k = k
+        self.counts = collections.Counter()
+        self.slack = 0
+
+    def update(self, counter):
+        'Merge in the counts from a Counter (or any mapping of value to count)'
+        self.counts.update(counter)
+        if len(self.counts) > 2 * self.k:
+            cut = heapq.nlargest(self.k + 1, self.counts.values())[-1]
+            self.slack += cut
+            self.counts = collections.Counter({x: c - cut for x, c in self.counts.items() if c > cut})
+
+    def most_common(self, n):
+        'The n values with the biggest counts, as (value, count) pairs'
+        return self.counts.most_common(n)
@@ -5,27 +5,24 @@ A module to line up text tables.
 Toby Thurston -- May 2025
 '''
 
-import ast
-import argparse
 import builtins
 import collections
-import csv
 import decimal
+import functools
+import heapq
 import io
 import itertools
 import math
+import operator
 import os
-import random
 import re
-import statistics
 import string
 import sys
-import textwrap
-import tokenize
 
-import tablinum.tab_fun_dates as tab_fun_dates
-import tablinum.tab_fun_maths as tab_fun_maths
-import tablinum.tab_fun_useful as tab_fun_useful
+# The other modules (ast, argparse, csv, fractions, random, statistics,
+# tokenize, the process pools, the helper modules, and so on) are imported
+# in the functions that need them, so that just lining up a table, which
+# is what the filter does most, does not have to wait for them to load.
 # import tab_fun_dates
 # import tab_fun_maths
 # import tab_fun_useful
@@ -38,67 +35,100 @@ import tablinum.tab_fun_useful as tab_fun_useful
 # the functions in this dictionary.  The idea is that the keys are what you the
 # user types and the values are the names of actual functions, either built-in
 # or provided by the helper modules.
+#
+# It is only built the first time it is needed, since that means importing
+# the helper modules, so use _panther() to get it (or Panther from outside).
+
+
+@functools.lru_cache(maxsize=None)
+def _panther():
+    "The Panther dict, built on first use"
+    import random
+    import tablinum.tab_fun_dates as tab_fun_dates
+    import tablinum.tab_fun_maths as tab_fun_maths
+    import tablinum.tab_fun_useful as tab_fun_useful
+
+    return {
+        'abs': builtins.abs,
+        'bool': builtins.bool,
+        'chr': builtins.chr,
+        'divmod': builtins.divmod,
+        'format': builtins.format,
+        'int': builtins.int,
+        'ord': builtins.ord,
+        'pow': builtins.pow,
+        'round': builtins.round,
+        'str': builtins.str,
+        'reversed': lambda x: ''.join(reversed(x)),
+        'exp': lambda x: decimal.Decimal(x).exp(),
+        'log': lambda x: decimal.Decimal(x).ln(),
+        'log10': lambda x: decimal.Decimal(x).log10(),
+        'sqrt': lambda x: decimal.Decimal(x).sqrt(),
+        'caps': lambda x: str(x).capitalize(),
+        'lower': lambda x: str(x).lower(),
+        'upper': lambda x: str(x).upper(),
+        'randomd': lambda: decimal.Decimal(str(random.random())),
+        'floor': math.floor,
+        'time': tab_fun_dates.as_time,
+        'base': tab_fun_dates.base,
+        'date': tab_fun_dates.date,
+        'dow': tab_fun_dates.dow,
+        'epoch': tab_fun_dates.epoch,
+        'make_date': tab_fun_dates.make_date,
+        'hms': tab_fun_dates.hms,
+        'hr': tab_fun_dates.hr,
+        'mins': tab_fun_dates.mins,
+        'secs': tab_fun_dates.secs,
+        'uktaxyear': tab_fun_dates.UK_tax_year,
+        'angle': tab_fun_maths.angle,
+        'cos': tab_fun_maths.cos, 'cosd': tab_fun_maths.cosd,
+        'tan': tab_fun_maths.cos, 'tand': tab_fun_maths.tand,
+        'gcd': tab_fun_maths.gcd_for_decimals,
+        'lcm': tab_fun_maths.lcm_for_decimals,
+        'comb': tab_fun_maths.comb_for_decimals,
+        'perm': tab_fun_maths.perm_for_decimals,
+        'hex': tab_fun_maths.decimal_to_hex,
+        'oct': tab_fun_maths.decimal_to_oct,
+        'dir': tab_fun_maths.dir,
+        'factors': tab_fun_maths.factors,
+        'mexp': tab_fun_maths.mexp,
+        'mlog': tab_fun_maths.mlog,
+        'pi': tab_fun_maths.PI,
+        'hypot': tab_fun_maths.pyth_add,
+        'sin': tab_fun_maths.sin, 'sind': tab_fun_maths.sind,
+        'tau': tab_fun_maths.TAU,
+        'len': tab_fun_useful.length,
+        'all': tab_fun_useful.t_all,
+        'any': tab_fun_useful.t_any,
+        'max': tab_fun_useful.t_max,
+        'min': tab_fun_useful.t_min,
+        'minp': tab_fun_useful.t_minp,
+        'sorted': tab_fun_useful.t_sorted,
+        'sum': tab_fun_useful.t_sum,
+        'Decimal': decimal.Decimal,
+        '__builtins__': {},
+    }
 
-Panther = {
-    'abs': builtins.abs,
-    'bool': builtins.bool,
-    'chr': builtins.chr,
-    'divmod': builtins.divmod,
-    'format': builtins.format,
-    'int': builtins.int,
-    'ord': builtins.ord,
-    'pow': builtins.pow,
-    'round': builtins.round,
-    'str': builtins.str,
-    'reversed': lambda x: ''.join(reversed(x)),
-    'exp': lambda x: decimal.Decimal(x).exp(),
-    'log': lambda x: decimal.Decimal(x).ln(),
-    'log10': lambda x: decimal.Decimal(x).log10(),
-    'sqrt': lambda x: decimal.Decimal(x).sqrt(),
-    'caps': lambda x: str(x).capitalize(),
-    'lower': lambda x: str(x).lower(),
-    'upper': lambda x: str(x).upper(),
-    'randomd': lambda: decimal.Decimal(str(random.random())),
-    'floor': math.floor,
-    'time': tab_fun_dates.as_time,
-    'base': tab_fun_dates.base,
-    'date': tab_fun_dates.date,
-    'dow': tab_fun_dates.dow,
-    'epoch': tab_fun_dates.epoch,
-    'make_date': tab_fun_dates.make_date,
-    'hms': tab_fun_dates.hms,
-    'hr': tab_fun_dates.hr,
-    'mins': tab_fun_dates.mins,
-    'secs': tab_fun_dates.secs,
-    'uktaxyear': tab_fun_dates.UK_tax_year,
-    'angle': tab_fun_maths.angle,
-    'cos': tab_fun_maths.cos, 'cosd': tab_fun_maths.cosd,
-    'tan': tab_fun_maths.cos, 'tand': tab_fun_maths.tand,
-    'gcd': tab_fun_maths.gcd_for_decimals,
-    'lcm': tab_fun_maths.lcm_for_decimals,
-    'comb': tab_fun_maths.comb_for_decimals,
-    'perm': tab_fun_maths.perm_for_decimals,
-    'hex': tab_fun_maths.decimal_to_hex,
-    'oct': tab_fun_maths.decimal_to_oct,
-    'dir': tab_fun_maths.dir,
-    'factors': tab_fun_maths.factors,
-    'mexp': tab_fun_maths.mexp,
-    'mlog': tab_fun_maths.mlog,
-    'pi': tab_fun_maths.PI,
-    'hypot': tab_fun_maths.pyth_add,
-    'sin': tab_fun_maths.sin, 'sind': tab_fun_maths.sind,
-    'tau': tab_fun_maths.TAU,
-    'len': tab_fun_useful.length,
-    'all': tab_fun_useful.t_all,
-    'any': tab_fun_useful.t_any,
-    'max': tab_fun_useful.t_max,
-    'min': tab_fun_useful.t_min,
-    'minp': tab_fun_useful.t_minp,
-    'sorted': tab_fun_useful.t_sorted,
-    'sum': tab_fun_useful.t_sum,
-    'Decimal': decimal.Decimal,
-    '__builtins__': {},
-}
+
+@functools.lru_cache(maxsize=None)
+def _module(name):
+    '''The module called name, imported the first time it is needed
+
+    For the functions that are called for every cell, where even the lookup
+    that an import statement does when the module is already loaded is slow.
+
+    >>> _module('tablinum.tab_fun_dates').__name__
+    'tablinum.tab_fun_dates'
+    '''
+    import importlib
+    return importlib.import_module(name)
+
+
+def __getattr__(name):
+    "Build Panther only when someone asks for it"
+    if name == 'Panther':
+        return _panther()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # various number utils at this level
 
@@ -188,79 +218,190 @@ def as_numeric_tuple(x, backwards=False):
     if backwards:
         alpha, omega = omega, alpha
 
+    return _classify_for_sort(x, alpha, omega)[1]
+
+
+# Precompiled patterns for _classify_for_sort
+_SORT_TIME = re.compile(r'(\d+):([0-5]\d):([0-5]\d(\.\d+)?)\Z')
+_SORT_MINUTES = re.compile(r'(\d+):([0-5]\d(\.\d+)?\Z)')
+_SORT_IP4 = re.compile(r'(\d+)\.(\d+)\.(\d+)\.(\d+)\Z')
+_SORT_LABEL = re.compile(r'(\D+)(\d+["\']?)\Z')
+_SORT_SUFFIX = re.compile(r'(\d+)([A-J])\Z')
+_SORT_SI = re.compile(r'(\d+\.\d*|\.?\d+)\s?([KMGT](I?B)?)\Z')
+_SORT_SI_VALUES = {
+    'K': 1000, 'M': 1000000, 'G': 1000000000, 'T': 1000000000000,
+    'KB': 1024, 'MB': 1048576, 'GB': 1073741824, 'TB': 1099511627776,
+    'KIB': 1024, 'MIB': 1048576, 'GIB': 1073741824, 'TIB': 1099511627776,
+}
+_SORT_MAC_CHARS = frozenset('0123456789ABCDEF:')
+
+
+def _classify_for_sort(x, alpha, omega):
+    '''Do the work for as_numeric_tuple, and say which kind of thing x was
+
+    The tests are tried in a fixed order, and the first one that fits wins, but
+    each test is guarded by a cheap look at the first character or the length,
+    so most strings skip straight past the tests that can't apply to them.
+
+    >>> _classify_for_sort('13:34:20', -1, 1)
+    ('time', (48860.0, '13:34:20'))
+    >>> _classify_for_sort('Total', -1, 1)
+    ('text', (-1, 'TOTAL'))
+    '''
     if x is None or x == '':
-        return (omega, '')  # put it at the bottom
+        return ('empty', (omega, ''))  # put it at the bottom
 
     try:
-        return (float(x), x)
+        return ('number', (float(x), x))
     except ValueError:
         pass
 
     try:
         # try to parse the date and return an ordinal number
-        return (tab_fun_dates.parse_date(x).toordinal(), x)
+        return ('date', (_module('tablinum.tab_fun_dates').parse_date(x).toordinal(), x))
     except ValueError:
         pass
 
-    # is this a time?
-    if (m := re.match(r'(\d+):([0-5]\d):([0-5]\d(\.\d+)?)\Z', x)) is not None:
-        return (int(m.group(1)) * 3600 + int(m.group(2)) * 60 + float(m.group(3)), x)
+    if x[0] == '.' or x[0].isdecimal():
+        # is this a time?
+        if (m := _SORT_TIME.match(x)) is not None:
+            return ('time', (int(m.group(1)) * 3600 + int(m.group(2)) * 60 + float(m.group(3)), x))
 
-    if (m := re.match(r'(\d+):([0-5]\d(\.\d+)?\Z)', x)) is not None:
-        return (int(m.group(1)) * 60 + float(m.group(2)), x)
+        if (m := _SORT_MINUTES.match(x)) is not None:
+            return ('minutes', (int(m.group(1)) * 60 + float(m.group(2)), x))
 
-    # is this an IP4 address?
-    if (m := re.match(r'(\d+)\.(\d+)\.(\d+)\.(\d+)\Z', x)) is not None:
-        a, b, c, d = map(int, m.groups())
-        if all(t < 256 for t in (a, b, c, d)):
-            return (a * 16777216 + b * 65536 + c * 256 + d, x)
+        # is this an IP4 address?
+        if (m := _SORT_IP4.match(x)) is not None:
+            a, b, c, d = map(int, m.groups())
+            if all(t < 256 for t in (a, b, c, d)):
+                return ('ip4', (a * 16777216 + b * 65536 + c * 256 + d, x))
 
     # is this a MAC address
-    if all(t in '0123456789ABCDEF:' for t in x):
-        if x.count(':') == 5:
-            if len(x) == 17:
-                return (int(x.replace(':', ''), 16), x)
+    if len(x) == 17 and x.count(':') == 5 and _SORT_MAC_CHARS.issuperset(x):
+        return ('mac', (int(x.replace(':', ''), 16), x))
 
     # perhaps it's a multi-level item number?
     if all(t in '0123456789.' for t in x):
-        return (tuple(int(n) for n in x.strip('.').split('.')), x)
+        return ('item', (tuple(int(n) for n in x.strip('.').split('.')), x))
 
     # now fold to upper case
     x = x.upper()
 
     # pad trailing numbers with zeros
     # Make A1, A2, A10 etc sortable...
-    if (m := re.match(r'(\D+)(\d+["\']?)\Z', x)) is not None:
-        return (alpha, m.group(1) + m.group(2).zfill(15))
-
-    # allow trailing suffixes a b c etc, 17a, 17b ... upto j (not 50k)
-    if (m := re.match(r'(\d+)([A-J])\Z', x)) is not None:
-        n, suffix = m.groups()
-        return (int(n) + (ord(suffix) % 256) / 256, x)
-
-    # allow SI suffixes
-    si_values = {
-        'K': 1000, 'M': 1000000, 'G': 1000000000, 'T': 1000000000000,
-        'KB': 1024, 'MB': 1048576, 'GB': 1073741824, 'TB': 1099511627776,
-        'KIB': 1024, 'MIB': 1048576, 'GIB': 1073741824, 'TIB': 1099511627776,
-    }
-    if (m := re.match(r'(\d+\.\d*|\.?\d+)\s?([KMGT](I?B)?)\Z', x)) is not None:
-        return (float(m.group(1)) * si_values.get(m.group(2), 1), x)
+    if not x[0].isdecimal() and (m := _SORT_LABEL.match(x)) is not None:
+        return ('label', (alpha, m.group(1) + m.group(2).zfill(15)))
+
+    if x[0] == '.' or x[0].isdecimal():
+        # allow trailing suffixes a b c etc, 17a, 17b ... upto j (not 50k)
+        if (m := _SORT_SUFFIX.match(x)) is not None:
+            n, suffix = m.groups()
+            return ('suffix', (int(n) + (ord(suffix) % 256) / 256, x))
+
+        # allow SI suffixes
+        if (m := _SORT_SI.match(x)) is not None:
+            return ('si', (float(m.group(1)) * _SORT_SI_VALUES.get(m.group(2), 1), x))
 
     # remove leading articles (Library sort)
     words = x.split()
     if len(words) > 1 and words.pop(0) in ('A', 'AN', 'THE'):
-        return (alpha, ' '.join(words))
+        return ('article', (alpha, ' '.join(words)))
 
     # catch tuples, and anything else that will evaluate to a Python value
+    # (but a Python literal can't start with a letter, unless it's a string prefix like B' or R")
+    lead = x.lstrip(' \t')[:3]
+    if not (lead[:1].isalpha() or lead[:1] == '_') or (lead[:1] in 'BRU' and ("'" in lead or '"' in lead)):
+        try:
+            return ('literal', (_module('ast').literal_eval(x), x))
+        except (SyntaxError, TypeError, ValueError, MemoryError, RecursionError):
+            pass
+
+    return ('text', (alpha, x))
+
+
+def _time_key(x):
+    "fast path for a column of times"
+    if (m := _SORT_TIME.match(x)) is not None:
+        return (int(m.group(1)) * 3600 + int(m.group(2)) * 60 + float(m.group(3)), x)
+    return None
+
+
+def _minutes_key(x):
+    "fast path for a column of minutes and seconds"
+    if (m := _SORT_MINUTES.match(x)) is not None:
+        return (int(m.group(1)) * 60 + float(m.group(2)), x)
+    return None
+
+
+def _ip4_key(x):
+    "fast path for a column of IP4 addresses"
+    if (m := _SORT_IP4.match(x)) is not None:
+        a, b, c, d = map(int, m.groups())
+        if a < 256 and b < 256 and c < 256 and d < 256:
+            return (a * 16777216 + b * 65536 + c * 256 + d, x)
+    return None
+
+
+def _mac_key(x):
+    "fast path for a column of MAC addresses"
+    if len(x) == 17 and x.count(':') == 5 and _SORT_MAC_CHARS.issuperset(x):
+        return (int(x.replace(':', ''), 16), x)
+    return None
+
+
+def _number_key(x):
+    "fast path for a column of plain numbers"
     try:
-        v = ast.literal_eval(x)
-    except (SyntaxError, TypeError, ValueError, MemoryError, RecursionError):
-        return (alpha, x)
+        return (float(x), x)
+    except (TypeError, ValueError):
+        return None
+
+
+# Each of these only accepts strings that all the earlier tests in
+# _classify_for_sort would reject, so trying one first can never give a
+# different answer from the full set of tests.
+_SORT_FAST_PATHS = {
+    'number': _number_key,
+    'time': _time_key,
+    'minutes': _minutes_key,
+    'ip4': _ip4_key,
+    'mac': _mac_key,
+}
+
+
+def numeric_tuple_key(values, backwards=False, sample_size=100):
+    '''Return a key function that agrees with as_numeric_tuple for all values,
+    but which is specialized for the type of thing that the values seem to be.
+
+    The type is inferred once, from the first few values, and then each value is
+    first tried against just that one test, and only sent through the full set of
+    tests in as_numeric_tuple if it does not fit.
+
+    >>> times = ['Time', '13:34:20', '8:56:02', '', '0:00:01']
+    >>> key = numeric_tuple_key(times)
+    >>> all(key(x) == as_numeric_tuple(x) for x in times)
+    True
+    >>> sorted(times, key=key)
+    ['Time', '0:00:01', '8:56:02', '13:34:20', '']
+    '''
+    alpha, omega = -1e12, 1e12
+    if backwards:
+        alpha, omega = omega, alpha
+
+    kinds = collections.Counter(_classify_for_sort(x, alpha, omega)[0]
+                                for x in itertools.islice(values, sample_size))
+    for kind, _ in kinds.most_common():
+        if kind in _SORT_FAST_PATHS:
+            fast_key = _SORT_FAST_PATHS[kind]
+            break
     else:
-        return (v, x)
+        return lambda x: _classify_for_sort(x, alpha, omega)[1]
+
+    def _key(x):
+        k = fast_key(x)
+        return _classify_for_sort(x, alpha, omega)[1] if k is None else k
 
-    return (alpha, x)
+    return _key
 
 
 def is_as_number(sss):
@@ -296,6 +437,11 @@ def is_as_number(sss):
     >>> is_as_number('14¾')
     (True, Decimal('14.75'))
     '''
+    return _memo['is_as_number'](sss)
+
+
+def _parse_number(sss):
+    '''Do the work for is_as_number, without the cache'''
     digits = '1234567890'
     ignore = '£$,_p'
     signs = '+-'
@@ -346,12 +492,55 @@ def as_decimal(n=0, na_value=decimal.Decimal('0')):
     >>> as_decimal('1E2341412541245251234534')
     Decimal('0')
     '''
+    if isinstance(n, str):
+        return _memo['as_decimal'](n, na_value)
+    return _parse_decimal(n, na_value)
+
+
+def _parse_decimal(n, na_value):
+    '''Do the work for as_decimal, without the cache'''
     try:
         return decimal.Decimal(n)
     except decimal.DecimalException:
         return na_value
 
 
+# Memo caches for the number parsers.  Real tables repeat their values a
+# lot (years, codes, small integers), so we keep the most recent results
+# in a bounded LRU cache.  The expression compiler adds its own cache to
+# this dict further down.  The cached functions live in this dict so that
+# set_cache_size can replace them with bigger or smaller ones.
+CACHE_SIZE = 65536
+_memo = {
+    'is_as_number': functools.lru_cache(maxsize=CACHE_SIZE)(_parse_number),
+    'as_decimal': functools.lru_cache(maxsize=CACHE_SIZE)(_parse_decimal),
+}
+
+
+def set_cache_size(maxsize=CACHE_SIZE, name=None):
+    '''Resize (and so empty) the named memo cache, or all of them
+
+    maxsize=0 turns caching off, maxsize=None lets the cache grow without limit.
+
+    >>> set_cache_size(2, 'is_as_number')
+    >>> cache_info()['is_as_number']
+    CacheInfo(hits=0, misses=0, maxsize=2, currsize=0)
+    >>> [is_as_number(x)[0] for x in ('1', '1', 'a', 'b', '1')]
+    [True, True, False, False, True]
+    >>> cache_info()['is_as_number']
+    CacheInfo(hits=1, misses=4, maxsize=2, currsize=2)
+    >>> set_cache_size()
+    '''
+    for k in _memo:
+        if name is None or k == name:
+            _memo[k] = functools.lru_cache(maxsize=maxsize)(_memo[k].__wrapped__)
+
+
+def cache_info():
+    '''Return a dict of the hits, misses, and sizes of each memo cache'''
+    return {k: f.cache_info() for k, f in _memo.items()}
+
+
 def siggy(s, n):
     '''Reduce to n sig figs
     >>> siggy('1,234', 2)
@@ -526,8 +715,28 @@ def compile_as_decimal(expr):
 
     Finally we untokenize the expression and compile it with the compile BIF.
 
+    The compiled code is kept in an LRU cache keyed by the expression text, so
+    running the same agenda over many tables only compiles each expression once.
+
+    >>> ok, cc = compile_as_decimal('a <> 3.5')
+    >>> ok, cc.co_names
+    (True, ('a', 'Decimal'))
+    >>> compile_as_decimal('a <> 3.5') == (ok, cc)
+    True
+    >>> compile_as_decimal('a +* 2')
+    (False, '?! syntax a +* 2')
+
     '''
+    return _memo['compile_as_decimal'](expr)
+
 
+def _rewrite_expression(expr):
+    '''Apply the syntactic sugar for compile_as_decimal, and return the new source text
+
+    >>> _rewrite_expression('2a mod 3 = 1')
+    (True, '(2 *a )%3 ==1 ')
+    '''
+    import tokenize
     out = []
     try:
         for tn, tv, _, _, _ in tokenize.generate_tokens(io.StringIO(expr).readline):
@@ -571,7 +780,14 @@ def compile_as_decimal(expr):
             break
         out[n:n + 2] = [op('('), out[n], op('*'), out[n+1], op(')')]
 
-    new_expr = tokenize.untokenize(out)
+    return (True, tokenize.untokenize(out))
+
+
+def _compile_expression(expr):
+    '''Do the work for compile_as_decimal, without the cache'''
+    ok, new_expr = _rewrite_expression(expr)
+    if not ok:
+        return (ok, new_expr)
 
     try:
         cc = compile(new_expr, '<string>', 'eval')
@@ -581,6 +797,347 @@ def compile_as_decimal(expr):
     return (True, cc)
 
 
+_memo['compile_as_decimal'] = functools.lru_cache(maxsize=CACHE_SIZE)(_compile_expression)
+
+
+# Names in an expression that depend on the whole table, so stop Table.stream
+# doing it a batch at a time
+STREAM_BLOCKERS = ('rows', 'row_number', 'total', 'col_total')
+STREAM_BATCH_SIZE = 10000
+
+# Tables with more rows than this are sorted in runs of this many rows on
+# disk, and merged back; None means always sort in memory
+SORT_RUN_SIZE = None
+SPILL_BLOCK_SIZE = 1000
+
+# Columns of more than SKETCH_MIN_ROWS numbers have their quantiles (for levels
+# and add median, quantiles, or q95 etc) estimated with a sketch that keeps
+# about this many values per level; None means always sort the whole column
+SKETCH_SIZE = 1000
+SKETCH_MIN_ROWS = 1000000
+
+# Once a column of words has more than DISTINCT_LIMIT different ones, levels
+# counts the rest with a HyperLogLog and keeps the commonest with a Misra-Gries
+# summary of TOP_ITEMS_SIZE counts, instead of counting every one of them
+DISTINCT_LIMIT = 1000000
+TOP_ITEMS_SIZE = 1000
+
+
+def _workers_from_environment():
+    '''How many processes to use for sort keys, from TABLINUM_WORKERS
+
+    >>> os.environ['TABLINUM_WORKERS'] = 'lots'
+    >>> _workers_from_environment()
+    0
+    >>> del os.environ['TABLINUM_WORKERS']
+    '''
+    try:
+        return int(os.environ.get('TABLINUM_WORKERS', '0'))
+    except ValueError:
+        return 0
+
+
+# Work out smart sort keys in this many processes (if more than 1), for tables
+# with at least PARALLEL_MIN_ROWS rows
+SORT_WORKERS = _workers_from_environment()
+PARALLEL_MIN_ROWS = 20000
+
+
+def _line_count(n, length):
+    '''How many lines for head or tail, with 10 by default, and
+    negative numbers counting back from the length
+
+    >>> _line_count('', 100), _line_count('5', 100), _line_count('-5', 100)
+    (10, 5, 95)
+    '''
+    try:
+        lines = int(n)
+    except ValueError:
+        lines = 10
+
+    # usual semantics for negative index
+    if lines < 0:
+        lines = length + lines
+    return lines
+
+
+def _ranks(keys, backwards=False):
+    '''Return the rank of each key, counting from 0, with equal keys sharing a rank
+
+    >>> _ranks(['b', 'a', 'c', 'a'])
+    [1, 0, 2, 0]
+    >>> _ranks(['b', 'a', 'c', 'a'], True)
+    [1, 2, 0, 2]
+    '''
+    ranks = [0] * len(keys)
+    rank = -1
+    previous = None
+    for i in sorted(range(len(keys)), key=keys.__getitem__, reverse=backwards):
+        if rank < 0 or keys[i] != previous:
+            rank += 1
+            previous = keys[i]
+        ranks[i] = rank
+    return ranks
+
+
+def _sort_keys(rows, c, want_reverse, want_smart, workers=0):
+    '''Work out the sort key for column c in each row, just once, sharing the
+    work between a pool of processes if workers > 1 and there are plenty of rows
+    '''
+    values = [row[c] for row in rows]
+    if not want_smart:
+        return values
+    if workers > 1 and len(values) >= PARALLEL_MIN_ROWS:
+        _, chunks = _chunked(values, workers)
+        keys = _parallel_map(_smart_keys, workers, chunks, itertools.repeat(want_reverse))
+        if keys is not None:
+            return list(itertools.chain.from_iterable(keys))
+    return _smart_keys(values, want_reverse)
+
+
+def _chunked(rows, workers):
+    "Split rows into about four chunks for each worker, and return the index where each starts too"
+    size = -(-len(rows) // (workers * 4))
+    starts = range(0, len(rows), size)
+    return starts, [rows[i:i + size] for i in starts]
+
+
+def _parallel_map(function, workers, *iterables):
+    '''Map function over the iterables in a pool of worker processes, and
+    return the list of results, or None if no pool can be started here
+    '''
+    import concurrent.futures
+    import multiprocessing
+
+    # spawn, not fork, which is not safe once any threads have been started
+    context = multiprocessing.get_context('spawn')
+    try:
+        with concurrent.futures.ProcessPoolExecutor(workers, mp_context=context) as pool:
+            return list(pool.map(function, *iterables))
+    except (OSError, NotImplementedError, concurrent.futures.BrokenExecutor):
+        return None
+
+
+def _smart_keys(values, want_reverse):
+    "The smart sort keys for a list of values (in a worker process, perhaps)"
+    return list(map(numeric_tuple_key(values, want_reverse), values))
+
+
+def _spill(records):
+    "Write a sorted run to a temporary file, a block at a time, and return the file"
+    import pickle
+    import tempfile
+    spill = tempfile.TemporaryFile()
+    for i in range(0, len(records), SPILL_BLOCK_SIZE):
+        pickle.dump(records[i:i + SPILL_BLOCK_SIZE], spill, pickle.HIGHEST_PROTOCOL)
+    spill.seek(0)
+    return spill
+
+
+def _unspill(spill):
+    "Read back a sorted run written by _spill, from wherever the file is now"
+    import pickle
+    while True:
+        try:
+            block = pickle.load(spill)
+        except EOFError:
+            return
+        yield from block
+
+
+class _Backwards:
+    "Wrap a sort key so that it sorts the other way round"
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+
+def _might_be_permutation(perm):
+    '''Could this arr argument be a simple permutation?  (We need to know the
+    number of columns to be sure, so this only rules out the ones that cannot)
+
+    >>> _might_be_permutation('dcba'), _might_be_permutation('ab(a+b)'), _might_be_permutation('-a')
+    (True, False, False)
+    '''
+    return bool(perm) and perm[0] != '-' and not any(c in perm for c in '?({')
+
+
+# Expressions that make a nested scope (or assign with :=) would see the
+# names differently if we ran them inside a function, so arr leaves them to
+# the row-at-a-time engine.
+_NEEDS_ROW_ENGINE = re.compile(r'\b(?:for|lambda|yield|await)\b|:=')
+
+# The builtins that the column functions use, since Panther hides the real ones
+_COLUMN_HELPERS = {
+    '_enumerate': enumerate,
+    '_zip': zip,
+    '_isinstance': isinstance,
+    '_tuple': tuple,
+    '_str': str,
+    '_is_multiplicated': is_multiplicated,
+    '_recoverable': (KeyError, ValueError, TypeError, NameError, AttributeError, decimal.InvalidOperation),
+    '_ZeroDivisionError': ZeroDivisionError,
+}
+
+
+def _compile_column_function(sources, names):
+    '''Compile a function that works out a whole "arr" at once
+
+    The function loops over the rows with each of the names bound to its
+    value from one of the columns passed to it, and evaluates each of the
+    expressions in turn in exactly the same way as the row engine in
+    Table._calculate_data does, but using fast local variables instead of
+    refreshing a dict of values for every row.  Returns None if the
+    expressions cannot be run like this.
+
+    >>> cc = _compile_column_function(('a+b',), ('row_number', 'a', 'b'))
+    >>> env = dict(_panther(), **_COLUMN_HELPERS)
+    >>> exec(cc, env)
+    >>> env['_columns_function']([range(1, 3), [1, 'x'], [2, 3]], lambda i, k: 'failed')
+    [[3], ['failed']]
+    '''
+    if any(_NEEDS_ROW_ENGINE.search(s) for s in sources):
+        return None
+    lines = [
+        'def _columns_function(_columns, _failed):',
+        '    _out = []',
+        f'    for _i, ({", ".join(names)},) in _enumerate(_zip(*_columns)):',
+        '        _row = []',
+    ]
+    for k, source in enumerate(sources):
+        lines.extend([
+            '        try:',
+            '            _v = (',
+            source,
+            '            )',
+            '        except _recoverable:',
+            f'            _row.append(_failed(_i, {k}))',
+            '        except _ZeroDivisionError:',
+            "            _row.append('-')",
+            '        else:',
+            '            if _isinstance(_v, _tuple):',
+            '                _row.extend(_v)',
+            '            elif _isinstance(_v, _str) and _is_multiplicated(_v):',
+            f'                _row.append(_failed(_i, {k}))',
+            '            else:',
+            '                _row.append(_v)',
+        ])
+    lines.extend([
+        '        _out.append(_row)',
+        '    return _out',
+    ])
+    try:
+        return compile('\n'.join(lines), '<arr>', 'exec')
+    except (SyntaxError, ValueError):
+        return None
+
+
+_memo['column_function'] = functools.lru_cache(maxsize=CACHE_SIZE)(_compile_column_function)
+
+
+def _tap_rows(cc, rows, values, col_totals, row_values):
+    '''Apply the compiled tap function cc to each number in the rows, and
+    return the new rows, counting row_number on from where values has it
+    '''
+    panther = _panther()
+    new_rows = []
+    for row in rows:
+        new_row = []
+        values['row_number'] += 1
+        values['row_total'] = sum(as_decimal(x) for x in row)
+        for i, (cell, (cell_is_a_number, x)) in enumerate(zip(row, row_values(row))):
+            values['x'] = x
+            values['col_number'] = i + 1
+            values['col_total'] = col_totals[i]
+            try:
+                new_value = eval(cc, panther, values)
+            except Exception:
+                new_row.append(cell)
+            else:
+                if isinstance(new_value, tuple):
+                    new_row.extend(new_value)
+                elif not cell_is_a_number and f"{new_value}".count(cell) > 2:
+                    # this was probably 'string'*9 or similar
+                    new_row.append(cell)
+                elif not cell_is_a_number and f"{new_value}" == "0":
+                    # this was probably a title row or col...
+                    new_row.append(cell)
+                else:
+                    new_row.append(new_value)
+        new_rows.append(new_row)
+    return new_rows
+
+
+def _tap_chunk(rows, start, fstring, values, col_totals, precision):
+    "Do a chunk of the rows for tap in a worker process, starting after row number start"
+    decimal.getcontext().prec = precision
+    _, cc = compile_as_decimal(fstring)
+    return _tap_rows(cc, rows, dict(values, row_number=start), col_totals,
+                     lambda row: [is_as_number(x) for x in row])
+
+
+def _parse_cell(j, text):
+    "Parse the text of a cell in column j"
+    return is_as_number(text)
+
+
+def _evaluate_columns(rows, names, letters, constants, literals, parse, carried=None, first=1):
+    '''Work out the new rows for "arr" with the column function for these names
+
+    Each name is turned into a list of values for the whole column, parsing
+    the cells with parse(j, text), and then the compiled function loops over
+    them all.  The running totals for the accumulators start from carried
+    (or 0), and row_number from first, so this can be given part of a table.
+    '''
+    carried = carried or {}
+    parsed = {}
+
+    def _parsed_column(j):
+        if j not in parsed:
+            parsed[j] = [parse(j, r[j]) for r in rows]
+        return parsed[j]
+
+    columns = []
+    for name in names:
+        if name == 'row_number':
+            columns.append(range(first, first + len(rows)))
+        elif name == 'row_total':
+            columns.append([sum(as_decimal(x) for x in r) for r in rows])
+        elif name.islower():
+            columns.append([v for _, v in _parsed_column(letters[name])])
+        else:
+            accumulator = carried.get(name, 0)
+            running_totals = []
+            for flag, v in _parsed_column(letters[name.lower()]):
+                if flag:
+                    accumulator += v
+                running_totals.append(accumulator)
+            columns.append(running_totals)
+
+    def _failed(i, k):
+        values = dict(constants)
+        values.update((name, column[i]) for name, column in zip(names, columns))
+        return _replace_values(literals[k], values)
+
+    code = _memo['column_function'](tuple(_rewrite_expression(x)[1] for x in literals), names)
+    env = dict(_panther(), **_COLUMN_HELPERS, **constants)
+    exec(code, env)
+    return env['_columns_function'](columns, _failed)
+
+
+def _arr_chunk(rows, first, carried, names, letters, constants, literals, precision):
+    "Do a chunk of the rows for arr in a worker process"
+    decimal.getcontext().prec = precision
+    return _evaluate_columns(rows, names, letters, constants, literals, _parse_cell, carried, first)
+
+
 def _replace_values(failed_expression, known_variables):
     '''replace the variables that we know about in the expression
     This is used when an eval fails.  The idea is that we replace the value
@@ -596,6 +1153,7 @@ def _replace_values(failed_expression, known_variables):
     >>> _replace_values("(s/x)", {'s': 'ex', 'x': 'hide_this'})
     'ex/hide_this'
     '''
+    import tokenize
     out = []
     for tn, tv, _, _, _ in tokenize.generate_tokens(io.StringIO(failed_expression).readline):
         if tn == tokenize.NAME and tv in known_variables:
@@ -610,6 +1168,251 @@ def _replace_values(failed_expression, known_variables):
     return new
 
 
+# Sums of decimals in this context never round, so a running total stays exact
+_EXACT = decimal.Context(prec=decimal.MAX_PREC, Emax=decimal.MAX_EMAX, Emin=decimal.MIN_EMIN)
+
+
+class _Aggregate:
+    '''The running value of one cell in a wide pivot
+
+    Each value is folded in as it arrives, so a cell holds a few numbers rather
+    than all of its values; only the ones that need to see everything, like
+    median, keep a list.  NaNs cannot be put in order, so min, max, and median
+    leave them out.  The mean and variance keep exact running sums, so
+    they agree with the statistics module to the last digit.
+
+    >>> cell = _Variance()
+    >>> for x in '1 2 3 4 5'.split():
+    ...     cell.add(x)
+    >>> cell.result()
+    Decimal('2.5')
+    >>> _Variance().result()
+    'NA'
+    '''
+    __slots__ = ()
+    name = ''
+
+
+class _Sum(_Aggregate):
+    __slots__ = ('total',)
+    name = 'sum'
+
+    def __init__(self):
+        self.total = 0
+
+    def add(self, value):
+        self.total += as_decimal(value)
+
+    def result(self):
+        return self.total
+
+
+class _Count(_Aggregate):
+    __slots__ = ('n',)
+    name = 'count'
+
+    def __init__(self):
+        self.n = 0
+
+    def add(self, value):
+        self.n += 1
+
+    def result(self):
+        return self.n
+
+
+class _Any(_Aggregate):
+    __slots__ = ('seen',)
+    name = 'any'
+
+    def __init__(self):
+        self.seen = False
+
+    def add(self, value):
+        self.seen = self.seen or bool(as_decimal(value))
+
+    def result(self):
+        return self.seen
+
+
+class _Alpha(_Aggregate):
+    __slots__ = ('text',)
+    name = 'alpha'
+
+    def __init__(self):
+        self.text = None
+
+    def add(self, value):
+        if self.text is None:
+            self.text = str(value)
+
+    def result(self):
+        return '-' if self.text is None else self.text
+
+
+class _Omega(_Alpha):
+    __slots__ = ()
+    name = 'omega'
+
+    def add(self, value):
+        self.text = str(value)
+
+
+class _Min(_Aggregate):
+    __slots__ = ('best',)
+    name = 'min'
+
+    def __init__(self):
+        self.best = None
+
+    def add(self, value):
+        x = as_decimal(value)
+        if x.is_nan():
+            return
+        if self.best is None or self.better(x, self.best):
+            self.best = x
+
+    @staticmethod
+    def better(x, y):
+        return x < y
+
+    def result(self):
+        return 'NA' if self.best is None else self.best
+
+
+class _Max(_Min):
+    __slots__ = ()
+    name = 'max'
+
+    @staticmethod
+    def better(x, y):
+        return x > y
+
+
+class _Mean(_Aggregate):
+    '''Exact running sums, which give the same answers as Welford's updates
+    would, but without the division for every value.  Infinities and NaNs
+    are added up separately, since they would spoil the sum of squares.
+    '''
+    __slots__ = ('n', 'total', 'odd')
+    name = 'mean'
+    least = 1
+
+    def __init__(self):
+        self.n = 0
+        self.total = decimal.Decimal(0)
+        self.odd = None
+
+    def add(self, value):
+        x = as_decimal(value)
+        self.n += 1
+        if not x.is_finite():
+            self.odd = x if self.odd is None else self.odd + x
+            return
+        self.fold(x)
+
+    def fold(self, x):
+        self.total = _EXACT.add(self.total, x)
+
+    def result(self):
+        if self.n < self.least:
+            return 'NA'
+        if self.odd is not None:
+            return self.odd
+        exact = self.exact()
+        return decimal.Decimal(exact.numerator) / decimal.Decimal(exact.denominator)
+
+    def exact(self):
+        import fractions
+        return fractions.Fraction(self.total) / self.n
+
+
+class _Variance(_Mean):
+    __slots__ = ('squares',)
+    name = 'variance'
+    least = 2
+
+    def __init__(self):
+        super().__init__()
+        self.squares = decimal.Decimal(0)
+
+    def fold(self, x):
+        self.total = _EXACT.add(self.total, x)
+        self.squares = _EXACT.fma(x, x, self.squares)
+
+    def exact(self):
+        import fractions
+        total = fractions.Fraction(self.total)
+        return (fractions.Fraction(self.squares) - total * total / self.n) / (self.n - 1)
+
+
+class _Median(_Aggregate):
+    __slots__ = ('values',)
+    name = 'median'
+
+    def __init__(self):
+        self.values = []
+
+    def add(self, value):
+        x = as_decimal(value)
+        if not x.is_nan():
+            self.values.append(x)
+
+    def result(self):
+        import statistics
+        return statistics.median(self.values) if self.values else 'NA'
+
+
+class _Reduction(_Aggregate):
+    "Keep all the values and reduce them at the end, for the ones that need to see them all"
+    __slots__ = ('func', 'values')
+
+    def __init__(self, func):
+        self.func = func
+        self.values = []
+
+    def add(self, value):
+        self.values.append(value)
+
+    def result(self):
+        try:
+            return self.func(self.values)
+        except ValueError:  # including statistics.StatisticsError
+            return 'NA'
+
+
+def _reducer(name):
+    '''The function that add uses to reduce a column called name, or None
+
+    >>> import statistics
+    >>> _reducer('median') is statistics.median, _reducer('total') is builtins.sum, _reducer('foo')
+    (True, True, None)
+    '''
+    import statistics
+    if hasattr(statistics, name):
+        return getattr(statistics, name)
+    if name in "min max all any sum".split():
+        return getattr(builtins, name)
+    if name == "total":
+        return builtins.sum
+    if name.startswith('q') and (points := _quantile_points(name)):
+        return functools.partial(_percentile, *points)
+    return None
+
+
+# The reductions that groupby can do with a running value instead of a list
+_RUNNING_AGGREGATES = {
+    'sum': _Sum,
+    'total': _Sum,
+    'count': _Count,
+    'mean': _Mean,
+    'any': _Any,
+    'min': _Min,
+    'max': _Max,
+    'variance': _Variance,
+}
+
+
 def quantile(ordered_data, p):
     '''get a particular linearly-interpolated percentile from sorted data
 
@@ -622,6 +1425,8 @@ def quantile(ordered_data, p):
     >>> quantile([1,2,3,4,5], 1)
     Decimal('5')
     >>> quantile([1,2,3,4,5], 2)
+    >>> quantile([decimal.Decimal('0.25'), decimal.Decimal('0.5')], 0.95)
+    Decimal('0.4875')
     '''
     n = len(ordered_data)
     if not 0 <= p <= 1:
@@ -630,9 +1435,13 @@ def quantile(ordered_data, p):
     if p == 1:
         return decimal.Decimal(ordered_data[-1])
 
-    f = math.floor(p * (n - 1))
-    w = decimal.Decimal(p * (n - 1)) - f
-    return decimal.Decimal((1 - w) * ordered_data[f] + w * ordered_data[f + 1])
+    # go through str so that a float like 0.95 counts as exactly 0.95
+    position = decimal.Decimal(str(p)) * (n - 1)
+    f = math.floor(position)
+    w = position - f
+    if w == 0:
+        return decimal.Decimal(ordered_data[f])
+    return decimal.Decimal(ordered_data[f] + w * (ordered_data[f + 1] - ordered_data[f]))
 
 
 def quantiles(data, pvalues=(0, 0.25, 0.5, 0.75, 1)):
@@ -644,8 +1453,56 @@ def quantiles(data, pvalues=(0, 0.25, 0.5, 0.75, 1)):
     return [quantile(x, p) for p in pvalues]
 
 
-def statistical_summary(numbers):
-    '''return a 4/6 field summary of a list of numbers
+def _percentile(p, data):
+    '''The p-th quantile of some numbers, in any order, as for add q95
+
+    >>> _percentile(0.95, list(range(101))), _percentile(0.5, [7]), _percentile(0.5, [])
+    (Decimal('95'), 7, 'NA')
+    '''
+    if len(data) < 2:
+        return data[0] if data else 'NA'
+    return quantile(sorted(data), p)
+
+
+def _quantile_points(fun):
+    '''The probabilities for a reduction that is a quantile, or None if it is not
+
+    >>> _quantile_points('median'), _quantile_points('q95'), _quantile_points('mean')
+    ((Decimal('0.5'),), (Decimal('0.95'),), None)
+    '''
+    if fun == 'median':
+        return (decimal.Decimal('0.5'),)
+    if fun == 'quantiles':
+        return tuple(decimal.Decimal(p) for p in ('0.25', '0.5', '0.75'))
+    if m := re.match(r'q(100|\d\d?)$', fun):
+        return (decimal.Decimal(m.group(1)) / 100,)
+    return None
+
+
+def _sketch_of(numbers, sketch_size):
+    '''A quantile sketch of numbers, or None if there are few enough to sort
+    (or so few that the sketch would keep them all anyway)
+
+    numbers can be any iterable, so a long column can go straight into the
+    sketch, without a list of it being made first.
+
+    >>> _sketch_of(range(10), 100) is None, _sketch_of(range(SKETCH_MIN_ROWS + 1), None) is None
+    (True, True)
+    >>> _sketch_of(iter(range(10)), 100) is None
+    True
+    '''
+    if not sketch_size or hasattr(numbers, '__len__') and len(numbers) <= SKETCH_MIN_ROWS:
+        return None
+    import tablinum.tab_sketches as tab_sketches
+    sketch = tab_sketches.QuantileSketch(sketch_size)
+    sketch.extend(numbers)
+    return sketch if sketch.n > SKETCH_MIN_ROWS and sketch.compacted else None
+
+
+def statistical_summary(numbers, sketch_size=None):
+    '''return a 4/6 field summary of a list of numbers, with the quartiles
+    estimated by a sketch if there are very many of them and sketch_size is set
+
     >>> statistical_summary([])
     ''
 
@@ -660,21 +1517,41 @@ def statistical_summary(numbers):
     if not numbers:
         return ''
 
+    import statistics
     me = statistics.mean(numbers)
     if len(numbers) > 10:
-        mi, lq, md, uq, ma = quantiles(numbers)
-        return f'Min: {mi}  Q25: {lq}  Median: {md}  Mean: {me}  Q75: {uq}  Max: {ma}'
+        sketch = _sketch_of(numbers, sketch_size)
+        if sketch is None:
+            mi, lq, md, uq, ma = quantiles(numbers)
+            return f'Min: {mi}  Q25: {lq}  Median: {md}  Mean: {me}  Q75: {uq}  Max: {ma}'
+        mi, lq, md, uq, ma = sketch.quantiles((0, 0.25, 0.5, 0.75, 1))
+        return (f'Min: {mi}  Q25: ~{lq}  Median: ~{md}  Mean: {me}  Q75: ~{uq}  Max: {ma}'
+                f'  (~ ranks within {sketch.rank_error:.2%})')
 
     return f'Min: {builtins.min(numbers)}  Mean: {me}  Max: {builtins.max(numbers)}'
 
 
-def counting_summary(factors, n=5):
-    '''summarize different levels in a factor
+def counting_summary(factors, n=5, distinct_limit=None):
+    '''summarize different levels in a factor, switching to sketches
+    once there are more than distinct_limit different ones
 
     >>> counting_summary('a b c d e f g h a b b b a c w'.split())
     'b 4, a 3, c 2, d 1, e 1 (and 4 others...)'
+    >>> counting_summary('a b c d e f g h a b b b a c w'.split() * 1000, 3, distinct_limit=5)
+    'b 4000, a 3000, c 2000 (and about 6 others, ±0.81%...)'
+    >>> counting_summary([f'u{i}' for i in range(5000)], distinct_limit=100)
+    'About 4989 distinct values, ±0.81%.'
     '''
-    counter = collections.Counter(factors)
+    if distinct_limit is None:
+        counter = collections.Counter(factors)
+    else:
+        counter = collections.Counter()
+        values = iter(factors)
+        for chunk in iter(lambda: list(itertools.islice(values, distinct_limit)), []):
+            counter.update(chunk)
+            if len(counter) > distinct_limit:
+                return _sketched_counting_summary(counter, values, n)
+
     if all(x == 1 for x in counter.values()):
         analysis = "All distinct."
     else:
@@ -685,19 +1562,154 @@ def counting_summary(factors, n=5):
     return analysis
 
 
+def _sketched_counting_summary(counter, values, n):
+    '''Carry on counting_summary with sketches, from the counts so far
+    and the rest of the values, a chunk at a time'''
+    import tablinum.tab_sketches as tab_sketches
+    distinct = tab_sketches.HyperLogLog()
+    common = tab_sketches.FrequentItems(TOP_ITEMS_SIZE)
+    while counter:
+        distinct.extend(counter)
+        common.update(counter)
+        counter = collections.Counter(itertools.islice(values, 10 * TOP_ITEMS_SIZE))
+
+    # a count of one or less might be a value seen once, so only show values seen at least twice
+    top = [(k, v) for k, v in common.most_common(n) if v > 1]
+    if not top:
+        return f'About {len(distinct)} distinct values, ±{distinct.error:.2%}.'
+
+    if common.slack:
+        analysis = ', '.join(f'{k} {v}..{v + common.slack}' for k, v in top)
+    else:
+        analysis = ', '.join(f'{k} {v}' for k, v in top)
+    others = max(len(distinct) - len(top), 0)
+    return analysis + f' (and about {others} others, ±{distinct.error:.2%}...)'
+
+
+class TypedColumn(dict):
+    '''The parsed values for one column of a Table, keyed by cell text
+
+    Each entry maps the text of a cell to the (flag, value) pair that
+    `is_as_number` gives for it, so each distinct value in a column is only
+    parsed once, however many verbs look at it.  Because the key is the text
+    itself, the entries stay correct when rows are sorted, shuffled, or
+    filtered, so there is nothing to keep in step with `Table.data`, but
+    Table drops the ones for cells that have gone after each verb that
+    changes the cells, so that the column does not grow without limit.
+
+    >>> c = TypedColumn()
+    >>> c['3.14']
+    (True, Decimal('3.14'))
+    >>> c['Label']
+    (False, 'Label')
+    >>> len(c)
+    2
+    '''
+
+    def __missing__(self, text):
+        self[text] = parsed = is_as_number(text)
+        return parsed
+
+
+class _ColumnStats:
+    '''The width of each column of a Table, and how many of its cells are numbers
+
+    This is all that tabulate needs to line up the columns, and Table keeps it
+    up to date as rows are inserted, so that printing a table does not have
+    to measure and parse every cell again.
+
+    >>> s = _ColumnStats()
+    >>> s.widen(2, '', False)
+    >>> s.add(['Label', '3.14'], [False, True])
+    >>> s.widen(3, '', False)
+    >>> s.add(['x', '-', '42'], [False, False, True])
+    >>> s.rows, s.widths, s.numbers
+    (2, [5, 4, 2], [0, 1, 1])
+    '''
+    __slots__ = ('rows', 'widths', 'numbers')
+
+    def __init__(self):
+        self.rows = 0
+        self.widths = []
+        self.numbers = []
+
+    def widen(self, cols, filler, filler_is_number):
+        "Add columns, filled with filler in all the rows so far"
+        extra = cols - len(self.widths)
+        self.widths.extend([len(filler) if self.rows else 0] * extra)
+        self.numbers.extend([self.rows * filler_is_number] * extra)
+
+    def add(self, row, flags):
+        "Count one more row of cells, given a flag for each that is True if it is a number"
+        self.rows += 1
+        self.widths = list(map(max, self.widths, map(len, row)))
+        self.numbers = list(map(operator.add, self.numbers, flags))
+
+    def remove(self, columns, numbers, remaining):
+        """Stop counting some rows, given their cells column by column, how
+        many of each column are numbers, and the rows that remain
+
+        Only the columns where a row that went was one of the widest need be
+        measured again, since the others can't have got any narrower.
+
+        >>> s = _ColumnStats()
+        >>> s.widen(2, '', False)
+        >>> rows = [['Label', '3.14'], ['x', '42'], ['yy', '-']]
+        >>> for row, flags in zip(rows, [[False, True], [False, True], [False, False]]):
+        ...     s.add(row, flags)
+        >>> s.remove([('Label',), ('3.14',)], [0, 1], rows[1:])
+        >>> s.rows, s.widths, s.numbers
+        (2, [2, 2], [0, 1])
+        """
+        self.rows -= len(columns[0]) if columns else 0
+        self.numbers = list(map(operator.sub, self.numbers, numbers))
+        for j, column in enumerate(columns):
+            if self.widths[j] in map(len, column):
+                self.widths[j] = max(map(len, map(operator.itemgetter(j), remaining)), default=0)
+
+
+# Verbs (by method name) that only move rows or cells within their columns,
+# or only change the extras or the form, so the column stats stay the same,
+# verbs that only add rows through insert, which keeps the stats itself,
+# and verbs that only remove rows, after which the stats are put right
+_KEEPS_COLUMN_STATS = frozenset(('_sort_rows_by_col', '_shuffle_rows', '_roll_by_col',
+                                 'add_rule', '_add_grouping_blanks', '_remove_blank_extras',
+                                 '_set_output_form', '_describe_operations', '_explain_plan'))
+_ONLY_INSERTS_ROWS = frozenset(('_label_columns', 'push', '_append_reduction', '_generate_new_rows'))
+_ONLY_REMOVES_ROWS = frozenset(('_heads', '_tails', '_sort_and_truncate', '_remove_duplicates_by_col'))
+
+
 class Table:
     '''A class to hold a table -- and some functions thereon'''
 
-    def __init__(self):
-        " empty data and no rows or cols "
+    def __init__(self, typed=False):
+        '''empty data and no rows or cols
+
+        If typed is True, then keep a TypedColumn for each column, built as
+        the rows are inserted, so that the numeric verbs don't have to parse
+        the same cells over and over again, and keep the column stats for
+        tabulate from the start, since insert is parsing every cell anyway.
+        Change the rows of a typed table with its own methods and verbs, not
+        by editing data directly, or these will be out of date.  Otherwise the
+        stats are worked out each time they are needed.
+        '''
         decimal.getcontext().prec = 12
         self.data = []
         self.cols = 0
+        self.typed = typed
+        self._typed = collections.defaultdict(TypedColumn)
+        self._stats = _ColumnStats() if typed else None
         self.indent = 0
         self.extras = collections.defaultdict(set)
         self.form = 'plain'
         self.messages = []
+        self.notes = []  # shown with the messages, but without stopping the agenda
         self.stack = []  # used to cache popped items
+        self._row_offset = 0  # index of data[0] in the whole table, when this is a batch in stream
+        self.sort_run_size = SORT_RUN_SIZE
+        self.workers = SORT_WORKERS
+        self.sketch_size = SKETCH_SIZE
+        self.timings = None  # set this to a list to have a record of each step appended to it
         self.operations = {
             'add': self._append_reduction,
             'arr': self._rearrange_columns,
@@ -705,9 +1717,11 @@ class Table:
             'ditto': self._copy_down,
             'dp': self._fix_decimal_places,
             'dup': self._duplicate_item,
+            'explain': self._explain_plan,
             'filter': self._select_matching_rows,
             'gen': self._generate_new_rows,
             'group': self._add_grouping_blanks,
+            'groupby': self._aggregate_groups,
             'head': self._heads,
             'help': self._describe_operations,
             'make': self._set_output_form,
@@ -717,6 +1731,7 @@ class Table:
             'noblanks': self._remove_blank_extras,
             'pivot': self._wrangle,
             'pop': self.pop,
+            'profile': self._profile_agenda,
             'push': self.push,
             'roll': self._roll_by_col,
             'rule': self.add_rule,
@@ -736,10 +1751,16 @@ class Table:
     def __str__(self):
         "Print neatly"
 
-        out = self.messages + list(self.tabulate())
-        self.messages.clear()
+        out = self._take_messages() + list(self.tabulate())
         return "\n".join(out)
 
+    def _take_messages(self):
+        "The messages and notes to show above the table, which are then forgotten"
+        out = self.messages + self.notes
+        self.messages.clear()
+        self.notes.clear()
+        return out
+
     def __getitem__(self, i):
         "Like a list..."
         return self.data[i]
@@ -750,8 +1771,9 @@ class Table:
 
     def _describe_operations(self, dsl_verb=''):
         '''What commands are defined?'''
+        import textwrap
         if dsl_verb.lower() == 'arr':
-            verbs = sorted(x for x in Panther if x[0] in string.ascii_lowercase)
+            verbs = sorted(x for x in _panther() if x[0] in string.ascii_lowercase)
             msg = f'Functions for arr: {" ".join(verbs)}'
         else:
             msg = f'Try one of these: {" ".join(sorted(self.operations))}'
@@ -761,6 +1783,8 @@ class Table:
         "Clear data etc"
         self.data.clear()
         self.extras.clear()
+        self._typed.clear()
+        self._stats = _ColumnStats() if self.typed else None
         self.cols = 0
         self.indent = 0
 
@@ -772,43 +1796,27 @@ class Table:
 
     def _heads(self, n):
         "Truncate to top n rows"
-        # default / correct to 10
-        try:
-            lines = int(n)
-        except ValueError:
-            lines = 10
-
-        # usual semantics for negative index
-        if lines < 0:
-            lines = len(self.data) + lines
-
-        # remove extras after head
-        for i in range(lines + 1, len(self.data)):
-            if i in self.extras:
-                self.extras.pop(i)
-
-        # truncate data
-        self.data = self.data[:lines]
+        self._truncate(_line_count(n, len(self.data)), at_end=False)
 
     def _tails(self, n):
         "Truncate to last n rows"
-        # default to 10
-        try:
-            lines = int(n)
-        except ValueError:
-            lines = 10
+        self._truncate(_line_count(n, len(self.data)), at_end=True)
 
-        # usual semantics for negative index
-        if lines < 0:
-            lines = len(self.data) + lines
-
-        # remove extras before tail
-        for i in range(len(self.data) - lines):
+    def _truncate(self, lines, at_end, rows=None):
+        "Keep the top (or last) few lines, or the rows given in their place"
+        if at_end:
+            # remove extras before tail
+            doomed = range(len(self.data) - lines)
+        else:
+            # remove extras after head
+            doomed = range(lines + 1, len(self.data))
+        for i in doomed:
             if i in self.extras:
                 self.extras.pop(i)
 
-        # truncate data
-        self.data = self.data[-lines:]
+        if rows is None:
+            rows = self.data[-lines:] if at_end else self.data[:lines]
+        self.data = rows
 
     def parse_tex(self, lines_thing, append=False):
         "Read lines from an iterable thing of TeX source, and append to self"
@@ -881,6 +1889,7 @@ class Table:
 
         if r is not None:
             self.stack.append(r)
+            self._stats = None
 
         return r
 
@@ -903,19 +1912,30 @@ class Table:
 
     def insert(self, i, iterable, filler=''):
         "add a row, maintaining cols"
-        row = list(filler if x == '' else x for x in iterable)
+        # (checking for str first saves Decimal a slow comparison with '')
+        row = [filler if isinstance(x, str) and x == '' else x for x in iterable]
         n = len(row)
         if n < self.cols:
             row.extend([filler] * (self.cols - n))
         elif self.cols < n:
             for r in self.data:
                 r.extend([filler] * (n - self.cols))
+            if self._stats is not None:
+                self._stats.widen(n, str(filler), is_as_number(str(filler))[0])
             self.cols = n
 
         # if there are any cells in the new row, then insert at "i"
         # make sure values are strings, and normalize space in last cell
         if n > 0:
-            self.data.insert(i, [str(x) for x in row[:-1]] + [' '.join(str(row[-1]).split())])
+            new_row = [str(x) for x in row[:-1]] + [' '.join(str(row[-1]).split())]
+            self.data.insert(i, new_row)
+            if self._stats is not None:
+                if self.typed:
+                    # parse it now, while we are here
+                    flags = [self._typed[j][x][0] for j, x in enumerate(new_row)]
+                else:
+                    flags = [is_as_number(x)[0] for x in new_row]
+                self._stats.add(new_row, flags)
 
     def copy(self):
         "Implement the standard copy method"
@@ -926,24 +1946,591 @@ class Table:
         if agenda is None:
             return
 
+        self._do_steps(self._parse_agenda(agenda))
+
+    def _parse_agenda(self, agenda):
+        '''Split the agenda into a list of (verb, argument) steps
+
+        An unknown verb ends the list, with None for its argument.
+
+        >>> Table()._parse_agenda('arr ab(a+b) sort b rule')
+        [('arr', 'ab(a+b)'), ('sort', 'b'), ('rule', '')]
+        >>> Table()._parse_agenda(['foo', 'bar', 'add'])
+        [('foo', None)]
+        '''
         if not isinstance(agenda, list):
             agenda = agenda.split()
 
-        while agenda:
-            op = agenda.pop(0)
+        steps = []
+        words = iter(agenda)
+        op = next(words, None)
+        while op is not None:
             if op not in self.operations:
-                self.messages.append(f'?? {op}')
+                steps.append((op, None))
                 break
 
             # get any arguments
             argument = []
-            while agenda and agenda[0] not in self.operations:
-                argument.append(agenda.pop(0))
+            for word in words:
+                if word in self.operations:
+                    break
+                argument.append(word)
+            else:
+                word = None
 
-            self.operations[op](' '.join(argument))
+            steps.append((op, ' '.join(argument)))
+            op = word
+
+        return steps
+
+    def _do_steps(self, steps):
+        '''Do each step of the plan in turn, stopping at the first message
+
+        The column stats are kept through the steps that leave them right,
+        put right after the steps that only remove rows, and dropped after
+        any other step, to be worked out again when needed.  In the same way,
+        after any step but those that leave the stats right, a typed table
+        forgets the parsed values of cells that are no longer in it.
+        '''
+        for description, run, arguments in self._plan(steps):
+            name = getattr(run, '__name__', '')
+            kept = self._stats if name in _KEEPS_COLUMN_STATS or name in _ONLY_REMOVES_ROWS else None
+            before = self.data[:] if kept is not None and name in _ONLY_REMOVES_ROWS else None
+            if name not in _ONLY_INSERTS_ROWS:
+                self._stats = None  # so that insert leaves them alone
+            self._run_step(description, run, *arguments)
+            if kept is not None:
+                self._stats = kept if before is None else self._stats_after_removal(kept, before)
+            if self.typed and name not in _KEEPS_COLUMN_STATS and name not in _ONLY_INSERTS_ROWS:
+                self._forget_missing_values()
             if self.messages:
                 break
 
+    def _stats_after_removal(self, stats, before):
+        '''Put the column stats right, given the rows there were before a step that only removed some
+
+        When fewer rows remain than went, it is quicker to count the rest
+        afresh.  The flags come from the parsed values, which are still there.
+
+        >>> t = Table(typed=True)
+        >>> t.parse_lines(['Label  3.14', 'x  42', 'yy  -'])
+        >>> t.do('head 2')
+        >>> t._stats.rows, t._stats.widths, t._stats.numbers
+        (2, [5, 4], [0, 2])
+        >>> t.do('tail 1')
+        >>> t._stats.rows, t._stats.widths, t._stats.numbers
+        (1, [1, 2], [0, 1])
+        '''
+        after = self.data
+        if stats.rows != len(before) or len(stats.widths) != self.cols:
+            return None
+
+        def count(rows):
+            "The cells of the rows column by column, and how many of each column are numbers"
+            columns = list(zip(*rows))
+            flags = [map(operator.itemgetter(0), map(self._typed[j].__getitem__, column))
+                     for j, column in enumerate(columns)]
+            return columns, list(map(sum, flags))
+
+        if len(after) <= len(before) - len(after):
+            stats = _ColumnStats()
+            stats.widen(self.cols, '', False)
+            if after:
+                columns, stats.numbers = count(after)
+                stats.widths = [max(map(len, column)) for column in columns]
+                stats.rows = len(after)
+            return stats
+
+        # count the rows by identity, since push can put the same row back twice
+        remaining = collections.Counter(map(id, after))
+        removed = []
+        for row in before:
+            if remaining[id(row)]:
+                remaining[id(row)] -= 1
+            else:
+                removed.append(row)
+        if removed:
+            stats.remove(*count(removed), after)
+        return stats
+
+    def _forget_missing_values(self):
+        '''Keep only the parsed values of the cells that are still in the table
+
+        A column can't have more different values than there are rows, so
+        this only looks at the cells of a column when it has more than twice
+        as many parsed values as that, which means that at least half of them
+        have gone.  Since each of those had to be parsed, the look costs no
+        more than the parsing did, and the steps that change only a few cells
+        don't pay for a look at all of them.
+
+        >>> t = Table(typed=True)
+        >>> t.do('gen 100 tap x*2 head 3')
+        >>> dict(t._typed)
+        {0: {'2': (True, Decimal('2')), '4': (True, Decimal('4')), '6': (True, Decimal('6'))}}
+        >>> t.do('tap x+1 tap x+10')
+        >>> sorted(t._typed[0])
+        ['2', '3', '4', '5', '6', '7']
+        >>> t.do('tap x+10')
+        >>> dict(t._typed)
+        {0: {}}
+        '''
+        for j in [j for j in self._typed if j >= self.cols]:
+            del self._typed[j]
+        for j, parsed in self._typed.items():
+            if len(parsed) > 2 * len(self.data):
+                present = dict.fromkeys(r[j] for r in self.data)
+                self._typed[j] = TypedColumn((x, parsed[x]) for x in present if x in parsed)
+
+    def _run_step(self, description, run, *arguments, **options):
+        '''Call run with the arguments and options, and return what it returns
+
+        If self.timings is a list, append a dict to it with the description,
+        the wall and CPU seconds it took, the rows before and after, the cells
+        in the table it was given, and the peak memory it allocated, in bytes.
+        The CPU time is just for this process, so not for any workers, and
+        memory is measured with tracemalloc, which slows everything down.
+
+        >>> t = Table()
+        >>> t.timings = []
+        >>> t.do('gen 10 filter a>3')
+        >>> [(x['step'], x['rows_in'], x['rows_out'], x['cells']) for x in t.timings]
+        [('gen 10', 0, 10, 0), ('filter a>3', 10, 7, 10)]
+        '''
+        if self.timings is None:
+            return run(*arguments, **options)
+
+        import time
+        import tracemalloc
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start()
+        elif hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        record = {'step': description, 'rows_in': len(self.data), 'cells': len(self.data) * self.cols}
+
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            return run(*arguments, **options)
+        finally:
+            record['wall'] = time.perf_counter() - wall
+            record['cpu'] = time.process_time() - cpu
+            record['rows_out'] = len(self.data)
+            record['memory'] = max(tracemalloc.get_traced_memory()[1] - before, 0)
+            if not tracing:
+                tracemalloc.stop()
+            self.timings.append(record)
+
+    def _profile_agenda(self, agenda, top=''):
+        '''Do the agenda under cProfile, and add the functions that took longest to the messages
+
+        top is how many functions to show, 10 by default.  They are in order
+        of the time spent in each one itself, not counting the functions it
+        called, since that shows where the work is really being done.
+        '''
+        import cProfile
+        import pstats
+        profiler = cProfile.Profile()
+        timings, self.timings = self.timings, None  # this whole step is timed, but not the steps in it
+        try:
+            profiler.runcall(self._do_steps, self._parse_agenda(agenda))
+        finally:
+            self.timings = timings
+        stats = pstats.Stats(profiler).stats
+        n = int(top) if top.isdigit() else 10
+
+        def _where(func):
+            filename, line, name = func
+            return name if filename == '~' else f'{os.path.basename(filename)}:{line}({name})'
+
+        report = Table()
+        report.append(['Calls', 'Own s', 'Total s', 'Function'])
+        slowest = sorted(stats.items(), key=lambda item: item[1][2], reverse=True)[:n]
+        for func, (_, calls, own, total, _) in slowest:
+            report.append([calls, f'{own:.4f}', f'{total:.4f}', _where(func)])
+        calls = sum(v[1] for v in stats.values())
+        seconds = sum(v[2] for v in stats.values())
+        self.messages.append(f'profile: {calls} calls in {seconds:.3f} seconds')
+        self.messages.extend(f'profile: {line}' for line in report.tabulate())
+
+    def _plan(self, steps):
+        '''Turn a list of (verb, argument) steps into a plan of (description, method, arguments)
+
+        Some pairs of verbs can be done faster together, so the plan does them
+        together, when the answer will be the same:
+
+        - arr with a simple permutation, then another one, is done as one arr
+        - filter then arr with a simple permutation is done in one pass
+        - sort then filter is done as filter then sort, so there is less to sort
+        - sort then head or tail only picks out the rows it needs, without sorting the rest
+
+        The methods for the pairs check again when they are run, and just do
+        the two verbs in order if it would not be safe.
+
+        >>> t = Table()
+        >>> [d for d, _, _ in t._plan(t._parse_agenda('sort c filter b>3 filter a<9 arr ba arr ba dp 2'))]
+        ['filter b>3 before sort c', 'filter a<9 then arr ba in one pass', 'arr ba', 'dp 2']
+        '''
+        plan = []
+        steps = list(steps)
+        while steps:
+            op, argument = steps.pop(0)
+            if argument is None:
+                plan.append((f'?? {op}', self.messages.append, (f'?? {op}',)))
+                break
+
+            if op == 'explain':
+                rest = ' '.join(op if arg is None else f'{op} {arg}' for op, arg in steps)
+                plan.append(('explain ' + rest, self._explain_plan, (rest,)))
+                break
+
+            if op == 'profile':
+                rest = ' '.join(op if arg is None else f'{op} {arg}' for op, arg in steps)
+                head = 'profile' if argument is None else f'profile {argument}'
+                plan.append((f'{head} {rest}', self._profile_agenda, (rest, argument or '')))
+                break
+
+            next_op, next_argument = steps[0] if steps else (None, None)
+            if op == 'sort' and next_op == 'filter' and self._can_filter_first(argument, next_argument):
+                steps.pop(0)
+                plan.append((f'filter {next_argument} before sort {argument}'.strip(),
+                             self._filter_before_sort, (argument, next_argument)))
+            elif op == 'sort' and next_op in ('head', 'tail'):
+                steps.pop(0)
+                words = ('sort', argument, 'then', next_op, next_argument, 'as a partial sort')
+                plan.append((' '.join(w for w in words if w),
+                             self._sort_and_truncate, (argument, next_argument, next_op == 'tail')))
+            elif (op == 'filter' and next_op == 'arr' and '@' not in argument
+                  and _might_be_permutation(next_argument)):
+                steps.pop(0)
+                plan.append((f'filter {argument} then arr {next_argument} in one pass',
+                             self._filter_and_arrange, (argument, next_argument)))
+            elif op == 'arr' and next_op == 'arr' and _might_be_permutation(argument) \
+                    and _might_be_permutation(next_argument):
+                steps.pop(0)
+                plan.append((f'arr {argument} then arr {next_argument} as one arr',
+                             self._arrange_twice, (argument, next_argument)))
+            else:
+                plan.append((f'{op} {argument}'.strip(), self.operations[op], (argument,)))
+
+        return plan
+
+    def _explain_plan(self, agenda):
+        "Show the plan for the agenda, instead of doing it"
+        self.messages.extend(f'plan: {d}' for d, _, _ in self._plan(self._parse_agenda(agenda)))
+        if not self.messages:
+            self.messages.append('plan: nothing to do')
+
+    def _can_filter_first(self, col_spec, expression):
+        "Would doing the filter before the sort give the same answer?"
+        return (expression is not None and expression != '' and '@' not in col_spec
+                and not looks_like_formula(col_spec.lstrip('='))
+                and self._is_row_local('filter', expression))
+
+    def _filter_before_sort(self, col_spec, expression):
+        '''Do "sort col_spec filter expression" with the filter first
+
+        Filter might drop the blanks, rules, and comments of the rows it
+        drops, so if there are any below the top two rows, the sort has to
+        come first, so that the filter sees the rows in the same order.
+        '''
+        if any(i > 1 and extras for i, extras in self.extras.items()):
+            self._sort_rows_by_col(col_spec)
+            self._select_matching_rows(expression)
+        else:
+            # if the filter fails we still sort, just as if we had done the sort first
+            self._select_matching_rows(expression)
+            self._sort_rows_by_col(col_spec)
+
+    def _sort_and_truncate(self, col_spec, n, at_end):
+        '''Do "sort col_spec head n" (or tail n) by selecting the rows with a heap
+
+        This gives the same rows in the same order as sorting the lot, ties and all,
+        because the row number is the last part of the key.
+        '''
+        lines = _line_count(n, len(self.data))
+        want_smart = not col_spec.startswith('=')
+        spec = col_spec[1:] if col_spec.startswith('=') else col_spec
+        if spec == '':
+            spec = string.ascii_lowercase[:self.cols]
+        if '@' in col_spec or looks_like_formula(spec) or not 0 < lines < len(self.data) \
+                or not all(x in string.ascii_letters + string.digits for x in spec):
+            self._sort_rows_by_col(col_spec)
+            if not self.messages:
+                self._truncate(_line_count(n, len(self.data)), at_end)
+            return
+
+        # put the keys the same way round as the first one, and wrap any that are not
+        columns = self._sort_columns(spec)
+        flipped = columns[0][1]
+        keys = []
+        for c, want_reverse in columns:
+            key = _sort_keys(self.data, c, want_reverse, want_smart, self.workers)
+            keys.append(key if want_reverse == flipped else list(map(_Backwards, key)))
+        step = -1 if flipped else 1
+        keys.append(range(0, step * len(self.data), step))
+
+        pick = heapq.nsmallest if flipped == at_end else heapq.nlargest
+        chosen = [abs(k[-1]) for k in pick(lines, zip(*keys))]
+        if at_end:
+            chosen.reverse()
+        self._truncate(lines, at_end, [self.data[i] for i in chosen])
+
+    def _simple_permutation(self, perm):
+        "Return the list of column indexes for a simple arr permutation, or None"
+        if not perm or perm.startswith('-'):
+            return None
+        identity = string.ascii_lowercase[:self.cols]
+        expressions = self._get_expr_list(perm)
+        if expressions and all(len(x) == 1 and x in identity for x in expressions):
+            return [ord(x) - ord('a') for x in expressions]
+        return None
+
+    def _filter_and_arrange(self, expression, perm):
+        "Do filter and then a simple arr in one pass, if we can"
+        columns = self._simple_permutation(perm)
+        if columns is None or self.stack:
+            self._select_matching_rows(expression)
+            if not self.messages:
+                self._rearrange_columns(perm)
+        else:
+            self._select_matching_rows(expression, columns)
+
+    def _arrange_twice(self, first, second):
+        "Do two simple arr permutations as one"
+        columns = self._simple_permutation(first)
+        if columns is not None and self.data and not self.stack:
+            scratch = Table()
+            scratch.cols = len(columns)
+            again = scratch._simple_permutation(second)
+            if again is not None:
+                self._rearrange_columns(''.join(chr(ord('a') + columns[j]) for j in again))
+                return
+
+        self._rearrange_columns(first)
+        if not self.messages:
+            self._rearrange_columns(second)
+
+    def _is_row_local(self, op, argument):
+        '''Can this step be done to a few rows at a time, getting the same answer as doing
+        it to the whole table at once?
+
+        >>> t = Table()
+        >>> t._is_row_local('filter', 'c>100'), t._is_row_local('filter', 'C>100')
+        (True, False)
+        >>> t._is_row_local('arr', 'ab(a+b)'), t._is_row_local('arr', 'ab(a/total)')
+        (True, False)
+        >>> t._is_row_local('sort', 'a')
+        False
+        '''
+        if op in ('dp', 'sf', 'nospace', 'ditto'):
+            return True
+
+        # ? makes random numbers, which would come in a different order
+        if op not in ('filter', 'arr', 'tap') or argument is None or '?' in argument or '@' in argument:
+            return False
+
+        if op == 'arr':
+            scratch = Table()
+            scratch.cols = 26
+            expressions = scratch._get_expr_list(argument)
+        else:
+            expressions = [argument]
+
+        for e in expressions:
+            ok, cc = compile_as_decimal(e)
+            if ok and any(n in STREAM_BLOCKERS or n in string.ascii_uppercase for n in cc.co_names):
+                return False
+        return True
+
+    def stream(self, source, agenda=None, method='parse_lines', batch_size=None, **options):
+        '''Read the source and do the agenda, without holding all the source in memory
+
+        The source can be anything that the parse method (parse_lines,
+        parse_tex, or parse_lol) accepts, and options are passed on to it.
+        The longest opening part of the agenda that is row-local (see
+        _is_row_local) is done to each batch of rows as it is read, so only
+        the rows that come out of that part are kept.  Then the rest of the
+        agenda is done to the table in the normal way.  The answer is the
+        same as parsing the whole source and then doing the agenda, except
+        that if the rows do not all have the same number of cells, short
+        rows are only padded to the width of the widest row read so far.
+
+        >>> t = Table()
+        >>> t.stream(f'{i}  {i * i}' for i in range(10))
+        >>> len(t)
+        10
+        >>> t.stream((f'{i}  {i * i}' for i in range(10000)), 'filter b<50 arr ba sort', batch_size=7)
+        >>> print(t)
+         0  0
+         1  1
+         4  2
+         9  3
+        16  4
+        25  5
+        36  6
+        49  7
+        '''
+        prefix, steps = self._split_row_local(agenda)
+        self.clear()
+        batches = 0
+        for chunk in self._stream_batches(source, prefix, method, batch_size, self.extras, **options):
+            batches += 1
+            for row in chunk.data:
+                self.append(row)
+
+        if self.messages:
+            return
+        if batches == 0:
+            # nothing to stream, but we still want any messages about the agenda
+            steps = prefix + steps
+        self._do_steps(steps)
+
+    def tabulate_stream(self, reopen, agenda=None, batch_size=None):
+        '''Generate the lines that stream and then str would, reading the source twice
+
+        reopen() should return (method, source, options) for a fresh read
+        of the source, as for stream.  If all the agenda is row-local, the
+        first pass works out the widths and alignments of the columns, and
+        the second does the agenda again and generates each line as it
+        goes, so no more than one batch of the table is ever held in
+        memory.  Otherwise, this just streams the source into the table and
+        tabulates it.
+
+        >>> def reopen():
+        ...     return 'parse_lines', (f'{i}  {i * i}' for i in range(10000)), {}
+        >>> t = Table()
+        >>> print('\\n'.join(t.tabulate_stream(reopen, 'filter b<50 arr ba', batch_size=7)))
+         0  0
+         1  1
+         4  2
+         9  3
+        16  4
+        25  5
+        36  6
+        49  7
+        >>> len(t)
+        0
+        '''
+        prefix, steps = self._split_row_local(agenda)
+        if steps or self.form == 'csv':
+            method, source, options = reopen()
+            self.stream(source, agenda, method, batch_size, **options)
+            yield from self._take_messages()
+            yield from self.tabulate()
+            return
+
+        # first pass: just collect the widths and the number of numbers in each column
+        self.clear()
+        method, source, options = reopen()
+        staging = Table()
+        widths = []
+        numbers = []
+        rows = 0
+        for chunk in self._stream_batches(source, prefix, method, batch_size, self.extras, **options):
+            staging.data.clear()
+            for row in chunk.data:
+                staging.append(row)
+            for row in staging.data:
+                if len(row) > len(widths):
+                    widths.extend([0] * (len(row) - len(widths)))
+                    numbers.extend([0] * (len(row) - len(numbers)))
+                for j, cell in enumerate(row):
+                    widths[j] = max(widths[j], len(cell))
+                    numbers[j] += is_as_number(cell)[0]
+            rows += len(staging.data)
+
+        yield from self._take_messages()
+        if rows == 0:
+            self._do_steps(prefix)
+            yield from self._take_messages()
+            return
+
+        self.cols = len(widths)
+        aligns = ['>' if n / rows > 0.5 else '<' for n in numbers]
+
+        # second pass: do it all again and print it, with a throwaway set of extras
+        method, source, options = reopen()
+        staging = Table()
+        done = 0
+        scratch = collections.defaultdict(set)
+        for chunk in self._stream_batches(source, prefix, method, batch_size, scratch, **options):
+            staging.data.clear()
+            for row in chunk.data:
+                staging.append(row)
+            for row in staging.data:
+                row.extend([''] * (self.cols - len(row)))
+            yield from self._lines(staging.data, widths, aligns, done)
+            done += len(staging.data)
+
+    def _split_row_local(self, agenda):
+        "Split the steps in the agenda into the longest row-local prefix, and the rest"
+        steps = [] if agenda is None else self._parse_agenda(agenda)
+        n = 0
+        while n < len(steps) and self._is_row_local(*steps[n]):
+            n += 1
+        return steps[:n], steps[n:]
+
+    def _stream_batches(self, source, prefix, method, batch_size, extras, **options):
+        '''Parse the source a batch at a time, do the prefix steps to each batch, and generate it
+
+        Any blanks, rules, and comments go into extras, keyed by where they
+        are in the whole source.  If one of the steps leaves a message, the
+        message is added to self.messages, and that step and the ones after
+        it are deleted from prefix (in place), just as do would stop there.
+        self.indent is set once the source runs out.
+        '''
+        parse = getattr(Table, method)
+        if batch_size is None:
+            batch_size = STREAM_BATCH_SIZE
+
+        parsed = 0
+        offsets = [0] * len(prefix)  # the number of rows that have gone into each step so far
+        previous = {}  # the last row from each ditto step, for the first row of the next batch
+        indents = []
+        width = 0
+        source = iter(source)
+        while batch := list(itertools.islice(source, batch_size)):
+            chunk = Table(typed=self.typed)
+            parse(chunk, batch, **options)
+
+            if chunk.data:
+                indents.append(chunk.indent)
+            width = max(width, chunk.cols)
+            for row in chunk.data:
+                row.extend([''] * (width - len(row)))
+            chunk.cols = width
+
+            # the extras stay where they were in the source, so keep one set for the whole table
+            for k, v in chunk.extras.items():
+                if k + parsed in extras:
+                    extras[k + parsed].update(v)
+                else:
+                    extras[k + parsed] = v  # the same set, so it comes out in the same order
+            chunk.extras = extras
+            parsed += len(chunk)
+
+            for i, (op, argument) in enumerate(prefix):
+                chunk._row_offset = offsets[i]
+                offsets[i] += len(chunk)
+                if op == 'ditto' and i in previous and chunk.data:
+                    marker = argument if argument.strip() else '"'
+                    above = previous[i] + [''] * (len(chunk.data[0]) - len(previous[i]))
+                    chunk.data[0] = [p if c == marker else c for c, p in zip(chunk.data[0], above)]
+
+                chunk.operations[op](argument)
+
+                if chunk.messages:
+                    self.messages.extend(chunk.messages)
+                    del prefix[i:]
+                    break
+                if op == 'ditto' and chunk.data:
+                    previous[i] = chunk.data[-1]
+
+            yield chunk
+
+        self.indent = min(indents, default=0)
+
     def _label_columns(self, names=''):
         "add some labels"
         # make list of pairs like so (word from names or None, letter)
@@ -961,10 +2548,27 @@ class Table:
     def column(self, i):
         "get a column from the table - zero indexed"
         try:
+            if self.typed:
+                parsed = self._typed[i]
+                return [parsed[r[i]] for r in self.data]
             return [is_as_number(r[i]) for r in self.data]
         except IndexError:
             return []
 
+    def _numbers_in_column(self, i):
+        "generate the numbers in a column, without making a list of them"
+        parse = self._typed[i].__getitem__ if self.typed else is_as_number
+        for r in self.data:
+            flag, value = parse(r[i])
+            if flag:
+                yield value
+
+    def _row_values(self, row):
+        "get the (flag, value) pairs for each cell in a row"
+        if self.typed:
+            return [self._typed[j][x] for j, x in enumerate(row)]
+        return [is_as_number(x) for x in row]
+
     def _valid_data_index(self, s):
         '''turn s into an index for self.data
         default to len(self.data)
@@ -1004,9 +2608,13 @@ class Table:
         self.cols = len(self.data)
         self.data = list(list(r) for r in zip(*self.data))
         self.extras.clear()
+        self._stats = None
 
-    def _select_matching_rows(self, expression):
+    def _select_matching_rows(self, expression, columns=None):
         '''Filter the table to rows where expression is true
+
+        If columns is a list of column indexes, just keep those columns from
+        each row we keep, as "arr" would do with a simple permutation.
         '''
         if not expression:
             return
@@ -1020,6 +2628,7 @@ class Table:
         if not ok:
             self.messages.append(cc)
         else:
+            panther = _panther()
             old_data = self.data[:]
             self.data.clear()
             identity = string.ascii_lowercase[:self.cols]
@@ -1032,13 +2641,13 @@ class Table:
             # instead of having to write b='whatever'.  The co_names attribute of the compiled code
             # is a list of the names in the compiled object
             for n in cc.co_names:
-                if n not in identity and n not in Panther and n not in value_dict:
+                if n not in identity and n not in panther and n not in value_dict:
                     value_dict[n] = n
 
             for i, r in enumerate(old_data):
                 value_dict['row_number'] = i + 1
-                for k, v in zip(identity, r):
-                    flag, value_dict[k] = is_as_number(v)
+                for k, (flag, v) in zip(identity, self._row_values(r)):
+                    value_dict[k] = v
                     if flag:
                         value_dict[k.upper()] += value_dict[k]
             
@@ -1048,13 +2657,18 @@ class Table:
                     value_dict[j.upper()] = value_dict[k.upper()]
 
                 try:
-                    wanted = eval(cc, Panther, value_dict)
+                    wanted = eval(cc, panther, value_dict)
                 except (TypeError, NameError, ArithmeticError):
                     wanted = True  # default to keeping the row
                 if wanted:
                     self.append(r)
-                elif i > 1 and i in self.extras:
-                    self.extras.pop(i)  # remove extras if line not wanted (unless we are at the top)
+                    if columns is not None:
+                        self.data[-1] = [self.data[-1][j] for j in columns]
+                elif i + self._row_offset > 1 and i + self._row_offset in self.extras:
+                    # remove extras if line not wanted (unless we are at the top)
+                    self.extras.pop(i + self._row_offset)
+            if columns is not None:
+                self.cols = len(columns)
 
         if header is not None:
             self.insert(0, header)
@@ -1064,6 +2678,7 @@ class Table:
 
     def _shuffle_rows(self, col_spec):
         '''Re-arrange the data at random'''
+        import random
         header = None
         if '@' in col_spec:
             header = self.pop(0)
@@ -1121,33 +2736,21 @@ class Table:
         }
         col_totals = [sum(as_decimal(x[1]) for x in self.column(i) if x[0]) for i in range(self.cols)]
 
-        old_rows = self.data[:]
-        self.data.clear()
-        for row in old_rows:
-            new_row = []
-            values['row_number'] += 1
-            values['row_total'] = sum(as_decimal(x) for x in row)
-            for i, cell in enumerate(row):
-                values['col_number'] = i + 1
-                values['col_total'] = col_totals[i]
-                cell_is_a_number, values['x'] = is_as_number(cell)
-                try:
-                    new_value = eval(cc, Panther, values)
-                except Exception:
-                    new_row.append(cell)
-                else:
-                    if isinstance(new_value, tuple):
-                        new_row.extend(new_value)
-                    elif not cell_is_a_number and f"{new_value}".count(cell) > 2:
-                        # this was probably 'string'*9 or similar
-                        new_row.append(cell)
-                    elif not cell_is_a_number and f"{new_value}" == "0":
-                        # this was probably a title row or col...
-                        new_row.append(cell)
-                    else:
-                        new_row.append(new_value)
+        new_rows = None
+        if self.workers > 1 and len(self.data) >= PARALLEL_MIN_ROWS:
+            starts, chunks = _chunked(self.data, self.workers)
+            repeat = itertools.repeat
+            new_rows = _parallel_map(_tap_chunk, self.workers, chunks, starts, repeat(fstring),
+                                     repeat(values), repeat(col_totals), repeat(decimal.getcontext().prec))
+            if new_rows is not None:
+                new_rows = itertools.chain.from_iterable(new_rows)
 
-            self.append(new_row)
+        if new_rows is None:
+            new_rows = _tap_rows(cc, self.data, values, col_totals, self._row_values)
+
+        self.data.clear()
+        for row in new_rows:
+            self.append(row)
 
     def _apply_formats(self, f_string, f_function):
         "Used for DP and SF"
@@ -1320,32 +2923,136 @@ class Table:
             fun_list = fun_list.replace('summary', 'min median mean max')
 
         for fun in (f.lower() for f in fun_list.split()):
-            if hasattr(statistics, fun):
-                func = getattr(statistics, fun)
-            elif fun in "min max all any sum".split():
-                func = getattr(builtins, fun)
-            elif fun == "total":
-                func = builtins.sum
-            else:
+            func = _reducer(fun)
+            if func is None:
                 self.messages.append(f'? {fun}')
                 continue
 
+            points = _quantile_points(fun)
+            error = 0
             footer = []
             for c in range(self.cols):
-                booleans, values = zip(*self.column(c))
-                decimals = list(itertools.compress(values, booleans))
-                if not any(booleans) or (c == 0 and looks_like_sequence(decimals)):
-                    footer.append(fun.title())
-                else:
-                    footer.append(func(decimals))
-
+                # a long column goes straight into the sketch, but column a might be a sequence
+                sketch = None
+                if points and c > 0 and len(self.data) > SKETCH_MIN_ROWS:
+                    sketch = _sketch_of(self._numbers_in_column(c), self.sketch_size)
+                if sketch is None:
+                    booleans, values = zip(*self.column(c))
+                    decimals = list(itertools.compress(values, booleans))
+                    if not any(booleans) or (c == 0 and looks_like_sequence(decimals)):
+                        footer.append(fun.title())
+                        continue
+                    if not points or (sketch := _sketch_of(decimals, self.sketch_size)) is None:
+                        footer.append(func(decimals))
+                        continue
+                estimates = sketch.quantiles(points)
+                footer.append(estimates if fun == 'quantiles' else estimates[0])
+                error = max(error, sketch.rank_error)
+
+            if error:
+                self.notes.append(f'# {fun} estimated, with ranks within {error:.2%}')
             self.append(footer)
 
+    def _aggregate_groups(self, spec):
+        '''Replace the table with one row for each group in the key columns
+
+        The first word gives the key columns, and the rest the reductions to make
+        for each group, using the same names as add, like "sum(c)" or "median(d)",
+        or just "count" for the number of rows.  It all happens in one pass over
+        the table, with a running value for the reductions that can have one.  The
+        groups come out in the order they are first seen.  An upper case key column
+        means that the first row is a header.
+
+        >>> t = Table()
+        >>> t.parse_lines(['a  x  1', 'b  y  2', 'a  z  3', 'b  z  x'])
+        >>> t.do('groupby a sum(c) mean(c) count')
+        >>> print(t)
+        a  4  2  2
+        b  2  2  2
+        '''
+        words = spec.split()
+        if not words or not self.data:
+            return
+
+        keys = []
+        has_header = False
+        for c in words[0]:
+            i, upper = self._fancy_col_index(c)
+            if i is None:
+                continue
+            keys.append(i)
+            has_header = has_header or upper
+        if not keys:
+            return
+
+        header = self.data[0] if has_header else None
+        labels = []
+        factories = []
+        sources = []
+        for word in words[1:] or ['count']:
+            m = re.match(r'([a-z]+)(?:\((\w)\))?$', word, re.IGNORECASE)
+            if m is None:
+                self.messages.append(f'? {word}')
+                continue
+            fun = m.group(1).lower()
+            if m.group(2) is None:
+                if fun != 'count':
+                    self.messages.append(f'? {word}')
+                    continue
+                c = None
+            else:
+                c, _ = self._fancy_col_index(m.group(2))
+                if c is None:
+                    continue
+
+            if fun in _RUNNING_AGGREGATES:
+                factories.append(_RUNNING_AGGREGATES[fun])
+            elif (func := _reducer(fun)) is not None:
+                factories.append(functools.partial(_Reduction, func))
+            else:
+                self.messages.append(f'? {word}')
+                continue
+            sources.append(c)
+            if has_header:
+                labels.append(fun if c is None else f'{fun}({header[c]})')
+
+        if self.typed:
+            def parse(j, x):
+                return self._typed[j][x]
+        else:
+            parse = _parse_cell
+
+        key_of = operator.itemgetter(*keys)
+        groups = dict()
+        for r in self.data[1:] if has_header else self.data:
+            key = key_of(r)
+            try:
+                cell = groups[key]
+            except KeyError:
+                cell = groups[key] = [f() for f in factories]
+            for a, c in zip(cell, sources):
+                if c is None:
+                    a.add(r)
+                    continue
+                is_number, value = parse(c, r[c])
+                if is_number:
+                    a.add(value)
+
+        self.data = []
+        self.cols = 0
+        self.extras.clear()
+        if has_header:
+            self.append([header[k] for k in keys] + labels)
+        for key, cell in groups.items():
+            self.append((list(key) if len(keys) > 1 else [key]) + [a.result() for a in cell])
+
     def _wrangle(self, shape):
         '''Reflow / pivot / reshape from wide to long or long to wide
 
         pivot wide assumes that col -1 has values and -2 has col head values
         and everything else are keys. Does nothing if there are less than 3 cols.
+        Instead of wide you can name an aggregate (sum, count, mean...) or several
+        of them, like "sum count", to get one column for each in a single pass.
 
         pivot long assumes only key is col A but you can add a letter or number
         to show where the keys stop -- so if the first three are keys then use "longc"
@@ -1355,22 +3062,33 @@ class Table:
         if not shape or self.cols < 3:
             return
 
-        pivot_functions_for = {
-            'wide': (builtins.sum, as_decimal),
-            'sum': (builtins.sum, as_decimal),
-            'count': (builtins.len, as_decimal),
-            'mean': (lambda a: statistics.mean(a) if a else 'NA', as_decimal),
-            'any': (builtins.any, as_decimal),
-            'alpha': (lambda a: a[0] if a else '-', str),
-            'omega': (lambda a: a[-1] if a else '-', str),
+        aggregates_for = {
+            'wide': _Sum,
+            'sum': _Sum,
+            'count': _Count,
+            'mean': _Mean,
+            'any': _Any,
+            'alpha': _Alpha,
+            'omega': _Omega,
+            'min': _Min,
+            'max': _Max,
+            'median': _Median,
+            'variance': _Variance,
         }
 
         shape = shape.lower()
 
-        for k in pivot_functions_for:
-            if k.startswith(shape):
-                self._wrangle_wide(*pivot_functions_for[k])
-                return
+        aggregates = []
+        for word in shape.split():
+            for k in aggregates_for:
+                if k.startswith(word):
+                    aggregates.append(aggregates_for[k])
+                    break
+            else:
+                break
+        else:
+            self._wrangle_wide(aggregates)
+            return
 
         if (m := re.match(r'long([1-9a-o])?$', shape)) is None:
             return
@@ -1386,9 +3104,10 @@ class Table:
         if self.cols - last_key_col > 1:
             self._wrangle_long(last_key_col)
 
-    def _wrangle_wide(self, fun=sum, prep=as_decimal):
-        '''Reflow wide'''
-        bags = collections.defaultdict(list)
+    def _wrangle_wide(self, aggregates=(_Sum,)):
+        '''Reflow wide, folding each value into the aggregates for its cell
+        as we go, with one column per name for each aggregate'''
+        cells = dict()
         names_seen = dict()
         keys_seen = dict()
         header = self.data[0][:-2]
@@ -1397,14 +3116,24 @@ class Table:
             key = tuple(key)
             names_seen[name] = True
             keys_seen[key] = True
-            bags[(key, name)].append(prep(value))
+            try:
+                cell = cells[(key, name)]
+            except KeyError:
+                cell = cells[(key, name)] = [a() for a in aggregates]
+            for a in cell:
+                a.add(value)
 
         self.data = []
         self.cols = 0
         names = list(names_seen)
-        self.append(header + names)
+        if len(aggregates) > 1:
+            header.extend(f'{n}:{a.name}' for n in names for a in aggregates)
+        else:
+            header.extend(names)
+        self.append(header)
+        empty = [a() for a in aggregates]
         for k in keys_seen:
-            self.append(list(k) + [fun(bags[(k, n)]) for n in names])
+            self.append(list(k) + [a.result() for n in names for a in cells.get((k, n), empty)])
 
     def _wrangle_long(self, keystop):
         '''Reflow long'''
@@ -1566,10 +3295,14 @@ class Table:
                 self.messages.append("Only lowercase ASCII allowed after -")
             return
 
+        if '?' in expressions:
+            import random
+            random_value = random.random
+
         def _get_value(row, c):
             '''Find a suitable value given the perm character and a row of data
             '''
-            return str(random.random()) if c == '?' else row[ord(c) - ord('a')]
+            return str(random_value()) if c == '?' else row[ord(c) - ord('a')]
 
         # simple case of re-arrangement and/or random values
         if all(len(x) == 1 and x in identity + '?' for x in expressions):
@@ -1585,6 +3318,14 @@ class Table:
                 return
             desiderata.append((cc, x))
 
+        new_rows = self._calculate_columns(desiderata)
+        if new_rows is not None:
+            self.data.clear()
+            self.cols = 0
+            for r in new_rows:
+                self.append(r)
+            return
+
         values = {
             "rows": len(self.data),
             "cols": self.cols,
@@ -1594,13 +3335,14 @@ class Table:
         for k in identity:
             values[k.upper()] = 0  # accumulators
 
+        panther = _panther()
         old_data = self.data.copy()
         self.data.clear()
         self.cols = 0
 
         for r in old_data:
-            for k, v in zip(identity, r):
-                flag, values[k] = is_as_number(v)
+            for k, (flag, v) in zip(identity, self._row_values(r)):
+                values[k] = v
                 if flag:
                     values[k.upper()] += values[k]
 
@@ -1617,7 +3359,7 @@ class Table:
             new_row = []
             for compiled_code, literal_code in desiderata:
                 try:
-                    new_value = eval(compiled_code, Panther, values)
+                    new_value = eval(compiled_code, panther, values)
                     if isinstance(new_value, tuple):
                         new_row.extend(new_value)
                     elif isinstance(new_value, str) and is_multiplicated(new_value):
@@ -1631,6 +3373,73 @@ class Table:
                     new_row.append("-")
             self.append(new_row)
 
+    def _calculate_columns(self, desiderata):
+        '''Do the calculations for "arr" a column at a time
+
+        Each name the expressions use is turned into a list of values for the
+        whole column, parsing only the columns that are needed, and then one
+        compiled function loops over them all (in chunks, in a pool of worker
+        processes, if self.workers > 1 and the table is long enough).  Returns
+        the new rows, or None if the row engine in _calculate_data has to do it instead.
+        '''
+        # short rows pick up values left over from the row above in the row engine
+        if any(len(r) != self.cols for r in self.data):
+            return None
+
+        identity = string.ascii_lowercase[:self.cols]
+        letters = {k: j for j, k in enumerate(identity)}
+        for j, k in zip("zyxw", reversed(identity)):
+            letters[j] = letters[k]
+
+        constants = {"rows": len(self.data), "cols": self.cols}
+        names = ['row_number']
+        for cc, _ in desiderata:
+            for name in cc.co_names:
+                if name.startswith('_'):
+                    return None
+                if name in names or name in constants:
+                    continue
+                if name == 'total':
+                    constants[name] = sum(as_decimal(x) for row in self.data for x in row)
+                elif name == 'row_total' or name in letters or name.isupper() and name.lower() in letters:
+                    names.append(name)
+
+        names = tuple(names)
+        literals = tuple(x for _, x in desiderata)
+        if _memo['column_function'](tuple(_rewrite_expression(x)[1] for x in literals), names) is None:
+            return None
+
+        if self.typed:
+            def parse(j, x):
+                return self._typed[j][x]
+        else:
+            parse = _parse_cell
+
+        if self.workers > 1 and len(self.data) >= PARALLEL_MIN_ROWS:
+            starts, chunks = _chunked(self.data, self.workers)
+
+            # the accumulators carry on from one chunk to the next, so work out
+            # where each one starts, adding in the same order as the whole table would
+            carried = [{} for _ in chunks]
+            for name in names:
+                if name.isupper():
+                    j = letters[name.lower()]
+                    accumulator = 0
+                    for k, chunk in enumerate(chunks):
+                        carried[k][name] = accumulator
+                        for flag, v in (parse(j, r[j]) for r in chunk):
+                            if flag:
+                                accumulator += v
+
+            repeat = itertools.repeat
+            new_rows = _parallel_map(_arr_chunk, self.workers, chunks, [i + 1 for i in starts], carried,
+                                     repeat(names), repeat(letters), repeat(constants), repeat(literals),
+                                     repeat(decimal.getcontext().prec))
+            if new_rows is not None:
+                return list(itertools.chain.from_iterable(new_rows))
+
+        return _evaluate_columns(self.data, names, letters, constants, literals, parse)
+
     def _fancy_col_index(self, column_letter):
         '''Find me an index, returns index + T/F to say if letter was upper case
 
@@ -1705,27 +3514,116 @@ class Table:
             self.do(f"arr ({col_spec})~ sort a arr -a")
 
         else:
-            for col in col_spec[::-1]:
-                c, want_reverse = self._fancy_col_index(col)
-                if c is None:
-                    continue
-                if want_smart:
-                    self.data.sort(key=lambda row: as_numeric_tuple(row[c], want_reverse),
-                                   reverse=want_reverse)
-                else:
-                    self.data.sort(key=lambda row: row[c], reverse=want_reverse)
+            columns = self._sort_columns(col_spec)
+            if columns and self.sort_run_size and len(self.data) > self.sort_run_size:
+                self._sort_in_runs(columns, want_smart)
+            elif want_smart and len(columns) > 1:
+                # work out the keys for each column once, and join them up into one
+                # flat tuple for each row, so the rows are only sorted once, the way
+                # the first column goes; a column that goes the other way uses its ranks
+                flipped = columns[0][1]
+                parts = []
+                for c, want_reverse in columns:
+                    keys = _sort_keys(self.data, c, want_reverse, want_smart, self.workers)
+                    if want_reverse != flipped:
+                        keys = [(r,) for r in _ranks(keys, True)]
+                    parts.append(keys)
+                composite = functools.reduce(lambda x, y: list(map(tuple.__add__, x, y)), parts)
+                order = sorted(range(len(self.data)), key=composite.__getitem__, reverse=flipped)
+                self.data[:] = [self.data[i] for i in order]
+            else:
+                for c, want_reverse in reversed(columns):
+                    if want_smart and self.workers > 1 and len(self.data) >= PARALLEL_MIN_ROWS:
+                        keys = _sort_keys(self.data, c, want_reverse, want_smart, self.workers)
+                        order = sorted(range(len(self.data)), key=keys.__getitem__, reverse=want_reverse)
+                        self.data[:] = [self.data[i] for i in order]
+                    elif want_smart:
+                        key = numeric_tuple_key([row[c] for row in self.data], want_reverse)
+                        self.data.sort(key=lambda row: key(row[c]), reverse=want_reverse)
+                    else:
+                        self.data.sort(key=lambda row: row[c], reverse=want_reverse)
 
         if header is not None:
             self.insert(0, header)
 
+    def _sort_in_runs(self, columns, want_smart):
+        '''Sort the rows a run at a time, and merge the runs
+
+        Each run of sort_run_size rows is sorted and written to a temporary
+        file along with its keys, so only one run of keys is ever in memory.
+        The keys agree with as_numeric_tuple whichever run they came from,
+        and the row number is the last part of each key, so the result is the
+        same as the sort in memory, ties and all.
+
+        The rows go to disk with their keys, and come back one at a time into
+        their new places in the table, so there is only ever one copy of
+        them, but the table itself must still fit in memory: it is only the
+        keys that are kept to one run at a time.
+
+        If anything goes wrong (the disk fills up, or you press Ctrl-C), the
+        rows are put back from the run in hand and the runs already written,
+        so the table is left as it was.
+        '''
+        rows = self.data
+        size = self.sort_run_size
+        flipped = columns[0][1]
+        step = -1 if flipped else 1
+        runs = []
+        in_hand = None  # where a run taken out of the table came from, until it is on disk
+        try:
+            for start in range(0, len(rows), size):
+                run = rows[start:start + size]
+                in_hand = (start, run)
+                rows[start:start + size] = itertools.repeat(None, len(run))
+                keys = []
+                for c, want_reverse in columns:
+                    column = _sort_keys(run, c, want_reverse, want_smart, self.workers)
+                    keys.append(column if want_reverse == flipped else list(map(_Backwards, column)))
+                keys.append(range(step * start, step * (start + len(run)), step))
+                records = list(zip(*keys, run))
+                del keys
+                records.sort(reverse=flipped)
+                runs.append(_spill(records))
+                in_hand = None
+                del records, run
+
+            for i, record in enumerate(heapq.merge(*map(_unspill, runs), reverse=flipped)):
+                rows[i] = record[-1]
+        except BaseException:
+            # every row is either in hand, or on disk with the number of the place it came from
+            for spill in runs:
+                spill.seek(0)
+                for record in _unspill(spill):
+                    rows[step * record[-2]] = record[-1]
+            if in_hand is not None:
+                start, run = in_hand
+                rows[start:start + len(run)] = run
+            raise
+        finally:
+            for spill in runs:
+                spill.close()
+
+    def _sort_columns(self, col_spec):
+        "List the (index, reverse flag) of each good column in col_spec"
+        columns = []
+        for col in col_spec:
+            c, want_reverse = self._fancy_col_index(col)
+            if c is not None:
+                columns.append((c, want_reverse))
+        return columns
+
     def _remove_duplicates_by_col(self, col_spec):
-        '''like uniq, remove row if key cols match the row above
+        '''like uniq, remove row if key cols match the row above, or with ! in
+        the col_spec, if they match any row above, so the data need not be sorted
         '''
         header = None
         if '@' in col_spec:
             header = self.pop(0)
             col_spec = col_spec.replace('@', '')
 
+        anywhere = '!' in col_spec
+        col_spec = col_spec.replace('!', '')
+
         if col_spec is None or col_spec == '':
             cols_to_check = list(range(self.cols))
         else:
@@ -1737,17 +3635,24 @@ class Table:
                 cols_to_check.append(i)
 
         if cols_to_check:
-            rows_to_delete = []
-            previous_t = ''
-            for i, row in enumerate(self.data):
-                this_t = ' '.join(row[j] for j in cols_to_check)
-                if previous_t == this_t:
-                    rows_to_delete.append(i)
-                else:
-                    previous_t = this_t
-
-            for i in reversed(rows_to_delete):
-                del self.data[i]
+            # a tuple of the cells (or just the cell), so "a b" + "c" is not "a" + "b c"
+            key = operator.itemgetter(*cols_to_check)
+            kept = []
+            if anywhere:
+                seen = set()
+                for row in self.data:
+                    k = key(row)
+                    if k not in seen:
+                        seen.add(k)
+                        kept.append(row)
+            else:
+                previous = None
+                for i, row in enumerate(self.data):
+                    k = key(row)
+                    if i == 0 or k != previous:
+                        kept.append(row)
+                        previous = k
+            self.data[:] = kept
 
         if header is not None:
             self.insert(0, header)
@@ -1789,9 +3694,9 @@ class Table:
                 label = chr(ord('a') + i)
 
             if all(flags):
-                analysis = statistical_summary(data)
+                analysis = statistical_summary(data, self.sketch_size)
             else:
-                analysis = counting_summary(data, 20)
+                analysis = counting_summary(data, 20, DISTINCT_LIMIT if self.sketch_size else None)
 
             self.messages.append(f'# {label}: {analysis}')
 
@@ -1826,6 +3731,7 @@ class Table:
         # this roundabout approach makes tabulate more consistent
         # for speed you could make csv write directly to sys.stdout
         if self.form == 'csv':
+            import csv
             out = io.StringIO()
             w = csv.writer(out, lineterminator=os.linesep)
             w.writerows(self.data)
@@ -1834,6 +3740,41 @@ class Table:
             out.close()
             return
 
+        stats = self._column_stats()
+        aligns = ['>' if n > stats.rows / 2 else '<' for n in stats.numbers]
+
+        yield from self._lines(self.data, stats.widths, aligns)
+
+    def _column_stats(self):
+        '''The widths of the columns and the count of numbers in each
+
+        A typed table keeps them as rows are inserted, through the verbs
+        that leave them right, and after the verbs that only remove rows,
+        so it need not look at every cell again.  Otherwise they are worked
+        out afresh each time, and not kept, since anyone might have changed
+        Table.data directly in the meantime.
+
+        >>> t = Table()
+        >>> t.parse_lines(['a  1', 'bbb  22'])
+        >>> t._column_stats().widths, t._stats is None
+        ([3, 2], True)
+        >>> t.data[0][0] = 'cccc'
+        >>> t._column_stats().widths, t._column_stats().numbers
+        ([4, 2], [0, 2])
+        '''
+        stats = self._stats
+        if stats is None or stats.rows != len(self.data) or len(stats.widths) != self.cols:
+            stats = _ColumnStats()
+            stats.rows = len(self.data)
+            stats.widths = [max((len(row[i]) for row in self.data), default=0) for i in range(self.cols)]
+            stats.numbers = [sum(flag for flag, _ in self.column(i)) for i in range(self.cols)]
+        return stats
+
+    def _lines(self, rows, widths, aligns, first=0):
+        '''Generate nicely lined up rows, given the widths and alignments of the columns
+
+        first is the index of rows[0] in the whole table, so we can find the extras
+        '''
         eol_marker = ''
         separator = '  '
         blank_line = None
@@ -1861,19 +3802,13 @@ class Table:
             comment_marker = '#'
             ruler = 'plain'
 
-        widths = [max(len(row[i]) for row in self.data) for i in range(self.cols)]
-        aligns = []
-        for i in range(self.cols):
-            booleans, _ = zip(*self.column(i))
-            aligns.append('>' if sum(booleans) / len(booleans) > 0.5 else '<')
-
         def _pipe_rule(w, a):
             '''A rule for piped format, given width and alignment
             '''
             return '-' * (w - 1) + (':' if a == '>' else '-')
 
         # generate nicely lined up rows
-        for i, row in enumerate(self.data):
+        for i, row in enumerate(rows, first):
             for ex in self.extras[i]:
                 if ex == 'rule' and ruler is not None:
                     if ruler == "plain":
@@ -1898,11 +3833,140 @@ class Table:
             yield ' ' * self.indent + separator.join(out).rstrip() + eol_marker  # no trailing blanks
 
 
-def filter():
-    parser = argparse.ArgumentParser()
+def read_source(fh, delim=''):
+    '''Work out how to read the lines from fh, without reading them all first
+
+    Only the first line is used to guess the format (or the first 1024
+    characters, if we are sniffing a CSV file).  Returns the name of the
+    Table method to parse them, an iterator of the lines or CSV rows for it
+    to parse, any keyword options it needs, and the output form that
+    matches the input (or None).
+
+    >>> method, source, options, form = read_source(io.StringIO("a | b | c | d\\n1 | 2 | 3 | 4\\n"))
+    >>> method, list(source), form
+    ('parse_lines', ['a | b | c | d\\n', '1 | 2 | 3 | 4\\n'], None)
+    >>> method, source, options, form = read_source(io.StringIO("a,b\\n1,2\\n"), ',')
+    >>> method, list(source)
+    ('parse_lol', [['a', 'b'], ['1', '2']])
+    '''
+    if not delim:
+        first_line = fh.readline()
+        lines = itertools.chain([first_line], fh)
+        first_line = first_line.strip()
+        # guess delim from content: tex & latex & pipe |
+        if first_line.count('&') > 0 and first_line.endswith("\\cr"):
+            return 'parse_tex', lines, {}, 'tex'
+
+        if first_line.count('&') > 0 and first_line.endswith("\\\\"):
+            return 'parse_tex', lines, {}, 'latex'
+
+        if first_line.count('|') > 2:
+            return 'parse_lines', lines, {'splitter': re.compile(r'\s*\|\s*')}, None
+
+        return 'parse_lines', lines, {'splitter': re.compile(r'\s{2,}')}, None
+
+    if delim == ',':
+        import csv
+        head = []
+        size = 0
+        for line in fh:
+            head.append(line)
+            size += len(line)
+            if size >= 1024:
+                break
+        lines = itertools.chain(head, fh)
+        try:
+            dialect = csv.Sniffer().sniff(''.join(head)[:1024])
+        except csv.Error:
+            return 'parse_lol', csv.reader(lines), {}, None
+        return 'parse_lol', csv.reader(lines, dialect), {'filler': '-'}, None
+
+    # check for a maxsplit spec ".3", "2.4" etc
+    if (m := re.match(r'(\d*)\.(\d+)', delim)) is not None:
+        delim = m.group(1)
+        if delim == '':
+            delim = '2'
+        cell_limit = int(m.group(2))
+    else:
+        cell_limit = 0
+
+    if delim.isdigit():
+        in_sep = re.compile(rf'\s{{{delim},}}')
+    else:
+        in_sep = re.compile(re.escape(delim))
+
+    return 'parse_lines', fh, {'splitter': in_sep, 'splits': cell_limit}, None
+
+
+def _filter_arguments(prog=None):
+    "The command line parser for tablinum_filter"
+    import argparse
+    parser = argparse.ArgumentParser(prog=prog)
     parser.add_argument("agenda", nargs='*', help="[delimiter.maxsplit] [verb [option]]...")
     parser.add_argument("--file", help="Source file name, defaults to STDIN")
-    args = parser.parse_args()
+    parser.add_argument("--stream", action="store_true",
+                        help="Do any row-by-row verbs at the start of the agenda as the input is read")
+    parser.add_argument("--sort-runs", type=int, metavar="ROWS",
+                        help="Sort tables of more than ROWS rows in runs of ROWS rows on disk")
+    parser.add_argument("--workers", type=int, default=_workers_from_environment(),
+                        help="Work out sort keys in this many processes (default $TABLINUM_WORKERS)")
+    parser.add_argument("--sketch", type=int, default=SKETCH_SIZE, metavar="K",
+                        help=f"Estimate quantiles of more than {SKETCH_MIN_ROWS} numbers with a sketch "
+                             "of K values a level, or 0 to sort them all")
+    parser.add_argument("--timings", action="store_true",
+                        help="Show the time, rows, and memory taken by each step on STDERR")
+    return parser
+
+
+def _timings_table(timings):
+    '''A Table of the records in Table.timings, with a total, for --timings
+
+    The total has the rows in of the first step, the rows out of the last,
+    and the largest of the peaks, since each one is measured from the start
+    of its step.
+
+    >>> keys = 'step wall cpu rows_in rows_out cells memory'.split()
+    >>> print(_timings_table([dict(zip(keys, ('sort a', 0.5, 0.25, 10, 10, 30, 2048))),
+    ...                       dict(zip(keys, ('head', 0.125, 0.125, 10, 5, 30, 0)))]))
+    Step    Wall s   CPU s  Rows in  Rows out  Cells  Peak KiB
+    ----------------------------------------------------------
+    sort a  0.5000  0.2500       10        10     30         2
+    head    0.1250  0.1250       10         5     30         0
+    ----------------------------------------------------------
+    Total   0.6250  0.3750       10         5     60         2
+    '''
+    report = Table()
+    report.append(['Step', 'Wall s', 'CPU s', 'Rows in', 'Rows out', 'Cells', 'Peak KiB'])
+    for t in timings:
+        report.append([t['step'], f"{t['wall']:.4f}", f"{t['cpu']:.4f}",
+                       t['rows_in'], t['rows_out'], t['cells'], round(t['memory'] / 1024)])
+    total = ['Total', f"{sum(t['wall'] for t in timings):.4f}", f"{sum(t['cpu'] for t in timings):.4f}"]
+    if timings:
+        total.extend([timings[0]['rows_in'], timings[-1]['rows_out'], sum(t['cells'] for t in timings),
+                      round(max(t['memory'] for t in timings) / 1024)])
+    report.append(total)
+    report.do('rule 1 rule -1')
+    return report
+
+
+def run_filter(argv=None, stdin=None, out=None, prog=None):
+    '''Do what tablinum_filter does, with the arguments in argv, reading stdin and printing to out
+
+    These default to the command line, sys.stdin, and sys.stdout, but the
+    daemon passes its own for each request, so that one process can serve
+    many of them.
+
+    >>> out = io.StringIO()
+    >>> run_filter(['gen', '4', 'wrap', '2'], io.StringIO(''), out)
+    >>> print(out.getvalue(), end='')
+    1  3
+    2  4
+    '''
+    args = _filter_arguments(prog).parse_args(argv)
+    if stdin is None:
+        stdin = sys.stdin
+    if out is None:
+        out = sys.stdout
 
     # Join the agenda args into one string, remove any backslash (for Vim),
     # and split into a list
@@ -1919,58 +3983,49 @@ def filter():
             agenda.insert(0, delim)
             delim = ''
 
-    table = Table()
-    fh = open(args.file) if args.file else io.StringIO("" if sys.stdin.isatty() else sys.stdin.read())
-
-    if not delim:
-        first_line = fh.readline().strip()
-        fh.seek(0)
-        # guess delim from content: tex & latex & pipe |
-        if first_line.count('&') > 0 and first_line.endswith("\\cr"):
-            table.parse_tex(fh)
-            table.do('make tex')
-
-        elif first_line.count('&') > 0 and first_line.endswith("\\\\"):
-            table.parse_tex(fh)
-            table.do('make latex')
-
-        elif first_line.count('|') > 2:
-            table.parse_lines(fh, splitter=re.compile(r'\s*\|\s*'))
-
-        else:
-            table.parse_lines(fh, splitter=re.compile(r'\s{2,}'))
-
-    elif delim == ',':
-        try:
-            dialect = csv.Sniffer().sniff(fh.read(1024))
-            fh.seek(0)
-            table.parse_lol(csv.reader(fh, dialect), filler='-')
-        except csv.Error:
+    table = Table(typed=True)
+    if args.sort_runs:
+        table.sort_run_size = args.sort_runs
+    table.workers = args.workers
+    table.sketch_size = args.sketch
+    if args.timings:
+        table.timings = []
+    fh = open(args.file) if args.file else io.StringIO("") if stdin.isatty() else stdin
+
+    method, source, options, form = read_source(fh, delim)
+    if form:
+        table.do(f'make {form}')
+
+    if args.stream and args.file:
+        # we can read a file twice, so we don't need to keep the table in memory at all
+        def _read_again():
             fh.seek(0)
-            table.parse_lol(csv.reader(fh))
+            return read_source(fh, delim)[:3]
+
+        lines = 0
+        for line in table.tabulate_stream(_read_again, agenda):
+            print(line, file=out)
+            lines += 1
+        if lines == 0:
+            print(file=out)
 
     else:
-        # check for a maxsplit spec ".3", "2.4" etc
-        if (m := re.match(r'(\d*)\.(\d+)', delim)) is not None:
-            delim = m.group(1)
-            if delim == '':
-                delim = '2'
-            cell_limit = int(m.group(2))
+        if args.stream:
+            table.stream(source, agenda, method, **options)
         else:
-            cell_limit = 0
+            table._run_step(method, getattr(table, method), source, **options)
+            table.do(agenda)
+        print(table._run_step('tabulate', str, table), file=out)
 
-        if delim.isdigit():
-            in_sep = re.compile(rf'\s{{{delim},}}')
-        else:
-            in_sep = re.compile(re.escape(delim))
+    if args.file is not None:
+        fh.close()
 
-        table.parse_lines(fh, splitter=in_sep, splits=cell_limit)
+    if args.timings:
+        print(_timings_table(table.timings), file=sys.stderr)
 
-    table.do(agenda)
-    print(table)
 
-    if args.file is not None:
-        fh.close()
+def filter():
+    run_filter()
 
 
 if __name__ == "__main__":
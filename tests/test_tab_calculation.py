@@ -1,6 +1,7 @@
 #! /usr/bin/env python3
 
 import unittest
+import unittest.mock
 
 import tablinum
 
@@ -415,3 +416,43 @@ D     0.7476  0.9234  0.8035  0.267833333333
 10  2024-10-01  xx10bb2024-10-01
 11  2024-11-01  xx11bb2024-11-01
 12  2024-12-01  xx12bb2024-12-01''')
+
+    def test_column_engine(self):
+        "arr works a column at a time when it can, and should get the same answers as the row engine"
+        data_with_header = '''
+Name    Temp   Press     Vol
+A     0.9757  0.8464  0.7741
+B     0.0761  0.5375  0.7719
+C     0.9557      -   0.6033
+D     0.7476  0.9234  0.8035
+'''.strip()
+        for agenda in ("arr abcd(c*d)(C)(Z)", "arr (row_total)(row_number/rows)(b/total)",
+                       "arr a(d/(row_number-2))(c, d)", "arr (upper(a))(b>c)(b mod .5)"):
+            with unittest.mock.patch.object(tablinum.Table, '_calculate_columns', return_value=None):
+                self.tab.parse_lines(data_with_header.splitlines())
+                self.tab.do(agenda)
+                expected = str(self.tab)
+            self.tab.parse_lines(data_with_header.splitlines())
+            self.tab.do(agenda)
+            self.assertEqual(str(self.tab), expected)
+
+    def test_worker_processes(self):
+        "arr and tap give the same answers when the rows are shared out between processes"
+        data_with_header = '''
+Name    Temp   Press     Vol
+A     0.9757  0.8464  0.7741
+B     0.0761  0.5375  0.7719
+C     0.9557      -   0.6033
+D     0.7476  0.9234  0.8035
+E     0.5       0.5     0.5
+'''.strip()
+        agenda = "arr abcd(C)(Z)(row_number) tap x*row_number"
+        self.tab.parse_lines(data_with_header.splitlines())
+        self.tab.do(agenda)
+        expected = str(self.tab)
+
+        self.tab.parse_lines(data_with_header.splitlines())
+        self.tab.workers = 2
+        with unittest.mock.patch('tablinum.tablinum.PARALLEL_MIN_ROWS', 1):
+            self.tab.do(agenda)
+        self.assertEqual(str(self.tab), expected)
@@ -1,6 +1,7 @@
 #! /usr/bin/env python3
 
 import subprocess
+import sys
 import unittest
 
 
@@ -35,3 +36,40 @@ G        582   61.650
 ---------------------
 Total   3909  536.012
 '''.lstrip())
+
+    def test_timings(self):
+        '''--timings shows each step once on STDERR, even with profile'''
+        cmd = ['tablinum_filter', '--timings', 'gen 300 profile 3 sort a filter a>5']
+        cp = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        self.assertEqual(cp.returncode, 0)
+        lines = cp.stderr.decode('utf-8').splitlines()
+        lines = [line for line in lines if not line.startswith(('-', 'Step'))]
+        steps = [line.split('  ')[0] for line in lines]
+        self.assertEqual(steps, ['parse_lines', 'gen 300', 'profile 3 sort a filter a>5',
+                                 'tabulate', 'Total'])
+
+        # rows in, rows out, and cells
+        rows = [line.split() for line in lines]
+        self.assertEqual([r[-4:-1] for r in rows], [
+            ['0', '0', '0'], ['0', '300', '0'], ['300', '295', '300'],
+            ['295', '295', '295'], ['0', '295', '595'],
+        ])
+        wall = [float(r[-6]) for r in rows]
+        self.assertAlmostEqual(sum(wall[:-1]), wall[-1], places=3)
+
+    def test_lazy_imports(self):
+        '''Lining up a table should not import the modules that only some verbs need'''
+        script = '''
+import sys
+from tablinum.tablinum import Table, filter
+t = Table(typed=True)
+t.parse_lines(['a  1', 'b  2'])
+str(t)
+print(' '.join(m for m in ('ast', 'csv', 'multiprocessing', 'random', 'statistics', 'tokenize',
+                           'tablinum.tab_fun_maths', 'tablinum.tab_sketches') if m in sys.modules))
+import tablinum.tablinum
+print(tablinum.tablinum.Panther['sqrt'](4))
+'''
+        cp = subprocess.run([sys.executable, '-c', script], stdout=subprocess.PIPE)
+        self.assertEqual(cp.returncode, 0)
+        self.assertEqual(cp.stdout.decode('utf-8'), '\n2\n')
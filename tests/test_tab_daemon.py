@@ -0,0 +1,144 @@
+#! /usr/bin/env python3
+
+import io
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+import unittest.mock
+
+from tablinum import tab_daemon
+
+
+class TestTableDaemon(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.env = dict(os.environ, TABLINUM_SOCKET=os.path.join(self.folder.name, 'tablinum.sock'))
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def run_both(self, cmd, text):
+        "Run the client and the filter with the same arguments and input"
+        client = subprocess.run(['tablinum_client'] + cmd, input=text.encode(), env=self.env,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        plain = subprocess.run(['tablinum_filter'] + cmd, input=text.encode(),
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        self.assertEqual(client.returncode, plain.returncode)
+        self.assertEqual(client.stdout, plain.stdout)
+        return client
+
+    def test_client(self):
+        '''The client gives the same answers with or without a daemon'''
+        some_lines = 'Name  Score\nAlice  12\nBob  15\n'
+        cp = self.run_both('sort B add'.split(), some_lines)
+        self.assertEqual(cp.stdout.decode('utf-8'), '''
+Name   Score
+Bob       15
+Alice     12
+Total     27
+'''.lstrip())
+
+        daemon = subprocess.Popen(['tablinum_daemon', '--idle', '30'], env=self.env)
+        try:
+            for _ in range(100):
+                if os.path.exists(self.env['TABLINUM_SOCKET']):
+                    break
+                time.sleep(0.1)
+
+            self.run_both('sort B add'.split(), some_lines)
+            self.run_both('--file tests/test-input.txt 1 dp 003 rule 1 rule add'.split(), '')
+            cp = self.run_both(['--no-such-option'], some_lines)
+            self.assertEqual(cp.returncode, 2)
+            self.run_both('--stream filter b>12 sort B'.split(), some_lines)
+            self.run_both('--file tests/test-input.txt head 2'.split(), some_lines * 10000)
+
+            # only one daemon for each socket
+            cp = subprocess.run(['tablinum_daemon'], env=self.env, stderr=subprocess.PIPE)
+            self.assertEqual(cp.returncode, 1)
+        finally:
+            daemon.terminate()
+            daemon.wait()
+
+    def test_client_is_thin(self):
+        '''Starting the client should not import the rest of tablinum'''
+        script = 'import sys, tablinum.tab_daemon; print("tablinum.tablinum" in sys.modules)'
+        cmd = [sys.executable, '-c', script]
+        cp = subprocess.run(cmd, stdout=subprocess.PIPE)
+        self.assertEqual(cp.stdout.decode('utf-8'), 'False\n')
+
+    def test_exit_status(self):
+        '''The daemon sends back the status the filter exits with, as Python would'''
+        for code, frames in ((None, [(b'x', b'0')]), (3, [(b'x', b'3')]),
+                             ('no good', [(b'2', b'no good\n'), (b'x', b'1')])):
+            daemon_end, client_end = socket.socketpair()
+            with daemon_end, client_end:
+                client_end.sendall(json.dumps({'argv': [], 'cwd': os.getcwd()}).encode() + b'\n')
+                client_end.shutdown(socket.SHUT_WR)
+                with unittest.mock.patch('tablinum.tablinum.run_filter', side_effect=SystemExit(code)):
+                    tab_daemon._handle(daemon_end)
+                daemon_end.shutdown(socket.SHUT_WR)
+                replies = client_end.makefile('rb')
+                got = []
+                while header := replies.read(tab_daemon._FRAME.size):
+                    channel, n = tab_daemon._FRAME.unpack(header)
+                    got.append((channel, replies.read(n)))
+            self.assertEqual(got, frames)
+
+    def test_settings(self):
+        '''The daemon uses the settings from the client's environment, for that request only'''
+        from tablinum import tablinum
+
+        def run_filter(argv, stdin, out, prog):
+            seen.append((os.environ.get('TABLINUM_WORKERS'), os.environ.get('TZ'),
+                         tablinum._filter_arguments().parse_args([]).workers))
+
+        settings = {'TABLINUM_WORKERS': '3', 'TZ': 'Asia/Tokyo'}
+        seen = []
+        daemon_end, client_end = socket.socketpair()
+        with daemon_end, client_end, unittest.mock.patch.dict(os.environ, {'TABLINUM_WORKERS': '2'}):
+            header = {'argv': [], 'cwd': os.getcwd(), 'settings': settings}
+            client_end.sendall(json.dumps(header).encode() + b'\n')
+            client_end.shutdown(socket.SHUT_WR)
+            with unittest.mock.patch('tablinum.tablinum.run_filter', run_filter):
+                tab_daemon._handle(daemon_end)
+            self.assertEqual(os.environ['TABLINUM_WORKERS'], '2')
+            self.assertEqual(os.environ.get('TZ'), self.env.get('TZ'))
+        self.assertEqual(seen, [('3', 'Asia/Tokyo', 3)])
+
+    def test_input_is_streamed(self):
+        '''The filter can start on standard input before the client has sent all of it'''
+        def run_filter(argv, stdin, out, prog):
+            out.write(stdin.readline())
+
+        daemon_end, client_end = socket.socketpair()
+        with daemon_end, client_end:
+            header = {'argv': [], 'cwd': os.getcwd(), 'stdin': True}
+            client_end.sendall(json.dumps(header).encode() + b'\nName  Score\n')
+            # no shutdown, so the daemon would wait for ever if it read all of stdin first
+            with unittest.mock.patch('tablinum.tablinum.run_filter', run_filter):
+                tab_daemon._handle(daemon_end)
+            replies = client_end.makefile('rb')
+            channel, n = tab_daemon._FRAME.unpack(replies.read(tab_daemon._FRAME.size))
+            self.assertEqual((channel, replies.read(n)), (b'1', b'Name  Score\n'))
+
+    def test_daemon_hangs_up(self):
+        '''If the daemon stops part way through, the client says so and fails'''
+        def replies(argv, stdin):
+            yield b'1', b'Name  Score\n'
+            raise EOFError('the daemon hung up')
+
+        out = io.TextIOWrapper(io.BytesIO())
+        with unittest.mock.patch.object(tab_daemon, 'request', replies), \
+                unittest.mock.patch.object(sys, 'argv', ['tablinum_client']), \
+                unittest.mock.patch.object(sys, 'stdin', None), \
+                unittest.mock.patch.object(sys, 'stdout', out):
+            with self.assertRaises(SystemExit) as cm:
+                tab_daemon.client()
+        self.assertEqual(cm.exception.code, 'tablinum_client: the daemon stopped before it finished')
+        self.assertEqual(out.buffer.getvalue(), b'Name  Score\n')
@@ -72,3 +72,35 @@ March 2020     2020-03-30  0.1  0.1  10.9  0.0  0.0   0.0   0.0   11.1
 
         self.tab.do('group ?')
         self.assertEqual(str(self.tab), '?! colspec ?\n' + self.rain)
+
+    def test_groupby(self):
+        "One row for each group, with several reductions"
+        self.tab.parse_lines(self.rain.splitlines())
+        self.tab.do('groupby A sum(j) max(j) count')
+        self.assertEqual(str(self.tab), '''
+Month          sum(Total)  max(Total)  count
+December 2019         1.4         1.4      1
+January 2020         51.0        20.8      4
+February 2020        83.6        33.1      4
+March 2020           50.1        19.7      5
+'''.strip())
+
+        self.tab.parse_lines(self.rain.splitlines())
+        self.tab.do('groupby A mean(c) median(j) frob(c)')
+        self.assertEqual(str(self.tab), '''
+? frob(c)
+Month          mean(Mon)  median(Total)
+December 2019          0            1.4
+January 2020        3.55           13.9
+February 2020      2.975          20.35
+March 2020          0.74           11.1
+'''.strip())
+
+        self.tab.parse_lines(self.rain.splitlines())
+        self.tab.do('pop 0 groupby a')  # default is count
+        self.assertEqual(str(self.tab), '''
+December 2019  1
+January 2020   4
+February 2020  4
+March 2020     5
+'''.strip())
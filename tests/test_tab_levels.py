@@ -1,6 +1,8 @@
 #! /usr/bin/env python3
 
+import random
 import unittest
+import unittest.mock
 
 import tablinum
 
@@ -64,3 +66,31 @@ US              Europe   510900         156     28494973
 
         self.tab.do('levels c')
         self.assertEqual(str(self.tab), '# c: All distinct.\n' + self.covid)
+
+    def test_sketched_levels(self):
+        "quartiles of long columns are estimated, and say so"
+        values = list(range(1, 1001))
+        random.Random(42).shuffle(values)
+        self.tab.parse_lines(str(v) for v in values)
+        with unittest.mock.patch('tablinum.tablinum.SKETCH_MIN_ROWS', 100):
+            self.tab.do('levels a')
+            self.tab.sketch_size = 8
+            self.tab.do('levels a')
+        self.assertEqual(self.tab.messages, [
+            '# a: Min: 1  Q25: 250.75  Median: 500.5  Mean: 500.5  Q75: 750.25  Max: 1000',
+            '# a: Min: 1  Q25: ~160  Median: ~470  Mean: 500.5  Q75: ~705  Max: 1000'
+            '  (~ ranks within 24.89%)',
+        ])
+
+    def test_sketched_counts(self):
+        "columns with very many different words are counted with sketches"
+        self.tab.parse_lines(self.covid.splitlines())
+        with unittest.mock.patch('tablinum.tablinum.DISTINCT_LIMIT', 2):
+            self.tab.do('levels AB')
+            self.tab.sketch_size = 0
+            self.tab.do('levels B')
+        self.assertEqual(self.tab.messages, [
+            '# Country: About 28 distinct values, ±0.81%.',
+            '# Region: Europe 14, America 8, Asia 5 (and about 1 others, ±0.81%...)',
+            '# Region: Europe 14, America 8, Asia 5, Africa 1',
+        ])
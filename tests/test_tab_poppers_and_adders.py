@@ -2,6 +2,7 @@
 "Tests for tabulate"
 
 import unittest
+import unittest.mock
 
 import tablinum
 
@@ -170,6 +171,36 @@ Year              Class A              Class B
 Mean       0.718074010601       0.378460968033
 '''.strip())
 
+    def test_percentiles(self):
+        "q95 and friends, sorting or with a sketch"
+        self.tab.parse_lines(f'x  {v}' for v in range(1000, 0, -1))
+        self.tab.do("add q95")
+        self.assertEqual(self.tab.data[-1], ['Q95', '950.05'])
+
+        # worked out in decimals, so they look just like the median
+        self.tab.clear()
+        self.tab.do("gen 20 arr a(a/4)")
+        for fun, expected in (('q95', '4.7625'), ('q5', '0.4875'), ('q50', '2.625'), ('median', '2.625')):
+            self.tab.do(f"add {fun} pop")
+            self.assertEqual(self.tab.stack[-1], [fun.title(), expected])
+
+        self.tab.parse_lines(f'x  {v}' for v in range(1000, 0, -1))
+        self.tab.sketch_size = 8
+        with unittest.mock.patch('tablinum.tablinum.SKETCH_MIN_ROWS', 100):
+            self.tab.do("add median")
+        self.assertEqual(self.tab.notes, ['# median estimated, with ranks within 24.89%'])
+        self.assertLess(abs(int(self.tab.data[-1][1]) - 500), 250)
+
+        # the note does not stop the rest of the agenda
+        with unittest.mock.patch('tablinum.tablinum.SKETCH_MIN_ROWS', 100):
+            self.tab.do("pop add median rule -1 tap x+1")
+        self.assertEqual(self.tab.messages, [])
+        self.assertEqual(self.tab.extras[len(self.tab) - 1], {'rule'})
+        self.assertEqual(self.tab.data[0], ['x', '1001'])
+        note = '# median estimated, with ranks within 24.89%'
+        self.assertEqual(str(self.tab).splitlines()[:2], [note, note])
+        self.assertEqual(self.tab.notes, [])
+
     def test_unknown_function(self):
         self.tab.parse_lines(self.rain.splitlines())
         self.assertEqual(str(self.tab), self.rain)
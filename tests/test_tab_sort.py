@@ -1,6 +1,7 @@
 #! /usr/bin/env python3
 
 import unittest
+import unittest.mock
 
 import tablinum
 
@@ -310,6 +311,125 @@ Mac                IP
         self.tab.do('shuffle sort bc')
         self.assertEqual(str(self.tab), pathlist)
 
+    def test_mixed_sorts(self):
+        "Sort on several columns going different ways"
+        self.tab.parse_lines(self.rain.splitlines())
+        self.tab.do('sort @kB')
+        expected = '''
+Date        Week  Mon  Tue  Wed  Thu  Fri  Sat   Sun  Total  Description
+------------------------------------------------------------------------
+2020-02-17     8  0.2  3.3  1.0  3.8  0.0  0.5   1.0    9.8  Damp
+2020-01-06     2  0.5  0.0  0.0  6.4  0.0  0.1   1.7    8.7  Damp
+2020-01-20     4  0.0  0.0  0.0  0.0  0.0  0.1   2.3    2.4  Dry
+2019-12-30     1  0.0  0.2  0.0  0.0  1.2  0.0   0.0    1.4  Dry
+2020-02-03     6  0.1  0.0  0.0  0.0  0.0  1.5  10.6   12.2  Humid
+2020-02-24     9  6.1  0.5  0.1  8.6  5.9  7.1   0.2   28.5  Monsoon
+2020-02-10     7  5.5  0.0  0.5  6.6  0.0  4.9  15.6   33.1  Monsoon
+2020-01-27     5  8.4  2.1  0.0  0.5  1.0  0.0   7.1   19.1  Wet
+2020-01-13     3  5.3  1.7  9.1  3.0  1.7  0.0   0.0   20.8  Wet
+'''.strip()
+        self.assertEqual(str(self.tab), expected)
+        self.tab.do('sort @Kb')
+        expected = '''
+Date        Week  Mon  Tue  Wed  Thu  Fri  Sat   Sun  Total  Description
+------------------------------------------------------------------------
+2020-01-13     3  5.3  1.7  9.1  3.0  1.7  0.0   0.0   20.8  Wet
+2020-01-27     5  8.4  2.1  0.0  0.5  1.0  0.0   7.1   19.1  Wet
+2020-02-10     7  5.5  0.0  0.5  6.6  0.0  4.9  15.6   33.1  Monsoon
+2020-02-24     9  6.1  0.5  0.1  8.6  5.9  7.1   0.2   28.5  Monsoon
+2020-02-03     6  0.1  0.0  0.0  0.0  0.0  1.5  10.6   12.2  Humid
+2019-12-30     1  0.0  0.2  0.0  0.0  1.2  0.0   0.0    1.4  Dry
+2020-01-20     4  0.0  0.0  0.0  0.0  0.0  0.1   2.3    2.4  Dry
+2020-01-06     2  0.5  0.0  0.0  6.4  0.0  0.1   1.7    8.7  Damp
+2020-02-17     8  0.2  3.3  1.0  3.8  0.0  0.5   1.0    9.8  Damp
+'''.strip()
+        self.assertEqual(str(self.tab), expected)
+
+    def test_sort_in_runs(self):
+        "Sorting a long table in runs on disk gives the same answer"
+        for spec in ('j', 'jB', '=J', 'Cb', '@kD', 'e'):
+            self.tab.clear()
+            self.tab.parse_lines(self.rain.splitlines())
+            self.tab.do(f'sort {spec}')
+            expected = str(self.tab)
+
+            self.tab.clear()
+            self.tab.parse_lines(self.rain.splitlines())
+            self.tab.sort_run_size = 2
+            self.tab.do(f'sort {spec}')
+            self.assertEqual(str(self.tab), expected)
+            self.tab.sort_run_size = None
+
+    def test_sort_in_runs_fails(self):
+        "If a run cannot be written, the table is left as it was"
+        for spec in ('j', 'J'):
+            self.tab.clear()
+            self.tab.parse_lines(self.rain.splitlines())
+            before = [r[:] for r in self.tab.data]
+            self.tab.sort_run_size = 2
+            spilled = []
+
+            def spill(records, real_spill=tablinum.tablinum._spill):
+                if len(spilled) == 2:
+                    raise OSError(28, 'No space left on device')
+                spilled.append(records)
+                return real_spill(records)
+
+            with unittest.mock.patch('tablinum.tablinum._spill', side_effect=spill):
+                with self.assertRaises(OSError):
+                    self.tab.do(f'sort {spec}')
+            self.assertEqual(self.tab.data, before)
+
+            # or if it is interrupted part way through putting them back
+            calls = []
+
+            def interrupted(records):
+                yield next(records)
+                raise KeyboardInterrupt
+
+            def unspill(spill, real_unspill=tablinum.tablinum._unspill):
+                calls.append(spill)
+                records = real_unspill(spill)
+                return interrupted(records) if len(calls) == 1 else records
+
+            with unittest.mock.patch('tablinum.tablinum._unspill', side_effect=unspill):
+                with self.assertRaises(KeyboardInterrupt):
+                    self.tab.do(f'sort {spec}')
+            self.assertEqual(self.tab.data, before)
+            self.tab.sort_run_size = None
+
+    def test_sort_in_parallel(self):
+        "Working out the keys in other processes gives the same answer"
+        for spec in ('a', 'jB'):
+            self.tab.clear()
+            self.tab.parse_lines(self.rain.splitlines())
+            self.tab.do(f'sort {spec}')
+            expected = str(self.tab)
 
-            
+            self.tab.clear()
+            self.tab.parse_lines(self.rain.splitlines())
+            self.tab.workers = 2
+            with unittest.mock.patch('tablinum.tablinum.PARALLEL_MIN_ROWS', 1):
+                self.tab.do(f'sort {spec}')
+            self.assertEqual(str(self.tab), expected)
+            self.tab.workers = 0
 
+    def test_uniq_anywhere(self):
+        "uniq ! keeps the first row with each key, without sorting"
+        self.tab.parse_lines(self.rain.splitlines())
+        self.tab.do('uniq @!k')
+        self.assertEqual(str(self.tab), '''
+Date        Week  Mon  Tue  Wed  Thu  Fri  Sat   Sun  Total  Description
+------------------------------------------------------------------------
+2019-12-30     1  0.0  0.2  0.0  0.0  1.2  0.0   0.0    1.4  Dry
+2020-01-06     2  0.5  0.0  0.0  6.4  0.0  0.1   1.7    8.7  Damp
+2020-01-13     3  5.3  1.7  9.1  3.0  1.7  0.0   0.0   20.8  Wet
+2020-02-03     6  0.1  0.0  0.0  0.0  0.0  1.5  10.6   12.2  Humid
+2020-02-10     7  5.5  0.0  0.5  6.6  0.0  4.9  15.6   33.1  Monsoon
+'''.strip())
+
+        # cells with spaces in are not confused
+        self.tab.clear()
+        self.tab.parse_lines(['a b  c', 'a  b c'])
+        self.tab.do('uniq')
+        self.assertEqual(str(self.tab), 'a b  c\na    b c')
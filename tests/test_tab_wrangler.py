@@ -122,6 +122,54 @@ West    2200  2500  1990  2600
         self.tab.do("pivot undefined")
         self.assertEqual(str(self.tab), sales)
 
+    def test_pivot_aggregates(self):
+        "Several aggregates at once, with repeated rows"
+        sales = '''
+Region  Quarter  Sales
+----------------------
+East    Q3        1500
+East    Q4        2200
+West    Q3        1990
+West    Q4         600
+West    Q4        1215
+East    Q4         640
+West    Q4         624
+'''.strip()
+        counter = '''
+Region  Q3:count  Q3:mean  Q4:count  Q4:mean
+--------------------------------------------
+East           1     1500         2     1420
+West           1     1990         3      813
+'''.strip()
+        ranger = '''
+Region  Q3:min  Q3:max  Q4:min  Q4:max
+--------------------------------------
+East      1500    1500     640    2200
+West      1990    1990     600    1215
+'''.strip()
+        spreader = '''
+Region  Q3:median  Q3:variance  Q4:median  Q4:variance
+------------------------------------------------------
+East         1500  NA                1420      1216800
+West         1990  NA                 624       121347
+'''.strip()
+
+        self.tab.parse_lines(sales.splitlines())
+        self.tab.do("pivot count mean")
+        self.assertEqual(str(self.tab), counter)
+
+        self.tab.parse_lines(sales.splitlines())
+        self.tab.do("pivot min max")
+        self.assertEqual(str(self.tab), ranger)
+
+        self.tab.parse_lines(sales.splitlines())
+        self.tab.do("pivot median var")
+        self.assertEqual(str(self.tab), spreader)
+
+        self.tab.parse_lines(sales.splitlines())
+        self.tab.do("pivot sum undefined")
+        self.assertEqual(str(self.tab), sales)
+
     def test_pivot_long(self):
         "Now try going the other way..."
 
@@ -1,5 +1,6 @@
 import doctest
 import unittest
+import unittest.mock
 
 import tablinum
 
@@ -443,6 +444,203 @@ Monday      Week  Mon  Tue  Wed  Thu  Fri  Sat  Sun  Total
         self.tab.do('label this that and the other')
         self.assertEqual(str(self.tab), "this  that  and  the  other")
 
+    def test_typed(self):
+        some_lines = '''
+Monday      Week  Mon  Tue  Wed  Thu  Fri  Sat  Sun  Total
+2020-01-13     3  5.3  1.7  9.1  3.0  1.7  0.0  0.0   20.8
+2020-01-27     5  8.4  2.1  0.0  0.5  1.0  0.0  7.1   19.1
+'''.strip()
+        typed = tablinum.Table(typed=True)
+        typed.parse_lines(some_lines.splitlines())
+        self.tab.parse_lines(some_lines.splitlines())
+        self.assertEqual(typed.column(1), self.tab.column(1))
+        self.assertEqual(typed.column(99), [])
+
+        agenda = "filter b>3 arr ab(c+d)z tap *2 add"
+        typed.do(agenda)
+        self.tab.do(agenda)
+        self.assertEqual(str(typed), str(self.tab))
+
+        # values that have gone from the table are forgotten, before they can outnumber the rows
+        typed.do("gen 1000 tap x*3 head 4")
+        for _ in range(5):
+            for j, parsed in typed._typed.items():
+                self.assertLessEqual(len(parsed), 2 * len(typed))
+            typed.do("tap x+1 dp 1")
+
+        typed.clear()
+        self.assertEqual(str(typed), '')
+
+    def test_stream(self):
+        some_lines = '''
+# Weekly figures
+Monday      Week  Mon  Tue  Wed  Thu  Fri  Sat  Sun  Total
+2020-01-13     3  5.3  1.7  9.1  3.0  1.7  0.0  0.0   20.8
+
+2020-01-20     4    "  2.0  0.0  1.5  0.7    "  0.0   12.2
+2020-01-27     5  8.4  2.1  0.0  0.5  1.0  0.0  7.1   19.1
+----------------------------------------------------------
+2020-02-03     6  0.0  0.0    "  0.0  0.0  7.2  0.5   16.0
+'''.strip()
+        agendas = ("ditto filter b>3 arr ab(c+d)z tap *2", "filter b<>4 dp 1 sort c", "arr abX",
+                   "filter b+ dp 2", "nospace filter c<5 sf 2")
+        for agenda in agendas:
+            for batch_size in (1, 2, 100):
+                self.tab.parse_lines(some_lines.splitlines())
+                self.tab.do(agenda)
+                streamed = tablinum.Table()
+                streamed.stream(some_lines.splitlines(), agenda, batch_size=batch_size)
+                expected = str(self.tab)
+                self.assertEqual(str(streamed), expected)
+
+                two_pass = tablinum.Table()
+                lines = two_pass.tabulate_stream(lambda: ('parse_lines', some_lines.splitlines(), {}),
+                                                 agenda, batch_size=batch_size)
+                self.assertEqual('\n'.join(lines), expected)
+
+    def test_plan(self):
+        some_lines = '''
+Monday      Week  Mon  Tue  Wed  Thu  Fri  Sat  Sun  Total
+2020-01-13     3  5.3  1.7  9.1  3.0  1.7  0.0  0.0   20.8
+2020-01-20     4  2.1  2.0  0.0  1.5  0.7  0.0  0.0   12.2
+2020-01-27     5  8.4  2.1  0.0  0.5  1.0  0.0  7.1   19.1
+'''.strip()
+        agenda = "sort C filter b>3 arr jab arr cba"
+        self.tab.parse_lines(some_lines.splitlines())
+        self.tab.do("explain " + agenda)
+        self.assertEqual(str(self.tab), '''
+plan: filter b>3 before sort C
+plan: arr jab then arr cba as one arr
+Monday      Week  Mon  Tue  Wed  Thu  Fri  Sat  Sun  Total
+2020-01-13     3  5.3  1.7  9.1  3.0  1.7  0.0  0.0   20.8
+2020-01-20     4  2.1  2.0  0.0  1.5  0.7  0.0  0.0   12.2
+2020-01-27     5  8.4  2.1  0.0  0.5  1.0  0.0  7.1   19.1'''.strip())
+
+        self.tab.do(agenda)
+        self.assertEqual(str(self.tab), '''
+Week  Monday      Total
+   5  2020-01-27   19.1
+   4  2020-01-20   12.2'''.strip())
+
+    def test_top_rows(self):
+        some_lines = '''
+Name   Score
+Alice     12
+Bob       15
+Cleo      12
+Dan        9
+Eve       15
+'''.strip()
+        self.tab.parse_lines(some_lines.splitlines())
+        self.tab.do("explain sort B head 3")
+        self.assertEqual(self.tab.messages, ['plan: sort B then head 3 as a partial sort'])
+        self.tab.messages.clear()
+
+        # ties stay in the order they were, just as with a full sort
+        self.tab.do("sort B head 3")
+        self.assertEqual(str(self.tab), '''
+Name  Score
+Bob      15
+Eve      15'''.strip())
+
+        self.tab.clear()
+        self.tab.parse_lines(some_lines.splitlines())
+        self.tab.do("sort bA tail 3")
+        self.assertEqual(str(self.tab), '''
+Alice  12
+Eve    15
+Bob    15'''.strip())
+
+    def test_column_stats(self):
+        some_lines = '''
+Name   Score
+Alice     12
+Bob       15
+Cleo    12.5
+'''.strip()
+        # an untyped table looks at every cell each time, so the data can be changed directly
+        tab = tablinum.Table()
+        tab.parse_lines(['a  1', 'b  2'])
+        str(tab)
+        tab.data[0][0] = 'a much longer label'
+        self.assertEqual(str(tab), '''
+a much longer label  1
+b                    2'''.strip())
+
+        tab = tablinum.Table(typed=True)
+        tab.parse_lines(some_lines.splitlines())
+        str(tab)
+
+        # inserting rows, and moving them about, should not need a look at every cell again
+        tab.do("shuffle roll sort B rule 1 add mean")
+        with unittest.mock.patch.object(tab, 'column', side_effect=AssertionError):
+            self.assertEqual(str(tab), '''
+Name           Score
+--------------------
+Bob               15
+Cleo            12.5
+Alice             12
+Mean   13.1666666667'''.strip())
+
+        # but anything that changes the cells needs a fresh look
+        tab.do("dp 1 head 3")
+        self.assertEqual(str(tab), '''
+Name  Score
+-----------
+Bob    15.0
+Cleo   12.5'''.strip())
+        tab.pop()
+        self.assertEqual(str(tab), '''
+Name  Score
+-----------
+Bob   15.0'''.strip())
+
+        # nor does removing rows, though the columns get narrower when the widest go
+        tab = tablinum.Table(typed=True)
+        tab.parse_lines(some_lines.splitlines() + ['Bartholomew  zero', 'Bob  15'])
+        str(tab)
+        tab.do("sort B head 5 uniq tail 3")
+        with unittest.mock.patch.object(tab, 'column', side_effect=AssertionError):
+            self.assertEqual(str(tab), '''
+Name  Score
+Bob      15
+Cleo   12.5'''.strip())
+
+    def test_timings(self):
+        some_lines = '''
+Name   Score
+Alice     12
+Bob       15
+Cleo      12
+'''.strip()
+        self.tab.parse_lines(some_lines.splitlines())
+        self.tab.timings = []
+        self.tab.do("sort B filter b>12 add")
+        # one record for each step of the plan
+        self.assertEqual([t['step'] for t in self.tab.timings], ['filter b>12 before sort B', 'add'])
+        self.assertEqual([(t['rows_in'], t['rows_out'], t['cells']) for t in self.tab.timings],
+                         [(4, 2, 8), (2, 3, 4)])
+        for t in self.tab.timings:
+            self.assertGreaterEqual(t['wall'], 0)
+            self.assertGreaterEqual(t['cpu'], 0)
+            self.assertGreaterEqual(t['memory'], 0)
+        self.assertEqual(str(self.tab), '''
+Name   Score
+Bob       15
+Total     15'''.strip())
+
+    def test_profile(self):
+        self.tab.do("gen 6 explain profile 3 sort A")
+        self.assertEqual(self.tab.messages, ['plan: profile 3 sort A'])
+        self.tab.messages.clear()
+
+        self.tab.do("profile 3 sort A head 2")
+        # a summary, a header, and the top three functions
+        self.assertEqual(len(self.tab.messages), 5)
+        self.assertRegex(self.tab.messages[0], r'^profile: \d+ calls in [.\d]+ seconds$')
+        self.assertEqual(self.tab.messages[1].split(), 'profile: Calls Own s Total s Function'.split())
+        self.assertEqual(str(self.tab).splitlines()[-2:], ['6', '5'])
+
 
 if __name__ == "__main__":
     unittest.main()